@@ -0,0 +1,189 @@
+# alert_engine.py
+"""
+Run-mode alert decisions.
+
+Every processed frame is a "hit" (eyes open or no face) or not. A policy gets
+(timestamp, hit) per frame and says when the "awake threshold" is reached.
+
+BlockPolicy - the original behaviour: 15s blocks, a block succeeds if more than
+    65% of its frames are hits, and the alert fires when the successful blocks
+    among the last 20 add up to awake_time (awake_time / 15 blocks).
+    Decisions only happen at block boundaries.
+
+SlidingWindowPolicy - streaming: keeps the seconds of hit frames inside the last
+    'window_seconds' as an incrementally updated sum, and fires on the frame
+    where that sum reaches awake_time. While it stays above, it fires again
+    every 'refire_interval' seconds (like a new block would).
+
+Both can export their window with get_state(now) and continue from it with
+restore_state(state, now) (see checkpoint.py). Times are stored relative to
+'now', so the time the program wasn't running is skipped, not counted.
+"""
+
+from collections import deque
+
+
+class BlockPolicy:
+    name = "block"
+
+    def __init__(self, block_seconds=15.0, blocks=20, block_ratio=0.65):
+        self.block_seconds = block_seconds
+        self.blocks = blocks
+        self.block_ratio = block_ratio
+        self.awake_time = 30
+        self.reset(0.0)
+
+    def reset(self, now, awake_time=None):
+        if awake_time is not None:
+            self.awake_time = awake_time
+        self.run_results = [0] * self.blocks
+        self.block_index = 0
+        self.success_sum = 0
+        self.block_start_time = now
+        self.block_frame_count = 0
+        self.block_hit_count = 0
+
+    def update(self, now, hit):
+        """
+        Returns (fired, block_info); block_info is a dict when a block just closed.
+        """
+        self.block_frame_count += 1
+        if hit:
+            self.block_hit_count += 1
+
+        if now - self.block_start_time <= self.block_seconds:
+            return (False, None)
+
+        ratio = 0.0
+        if self.block_frame_count > 0:
+            ratio = self.block_hit_count / float(self.block_frame_count)
+        success_val = 1 if (ratio > self.block_ratio) else 0
+
+        # FIFO slot: keep the running sum instead of sum() over the window
+        idx = self.block_index % self.blocks
+        self.success_sum += success_val - self.run_results[idx]
+        self.run_results[idx] = success_val
+        self.block_index += 1
+
+        # Reset for next block
+        self.block_hit_count = 0
+        self.block_frame_count = 0
+        self.block_start_time = now
+
+        threshold_blocks = self.awake_time / self.block_seconds
+        fired = self.success_sum >= threshold_blocks
+        return (fired, {"block_ratio": round(ratio, 2), "success": success_val, "sum": self.success_sum})
+
+    def window_summary(self):
+        return f"{self.success_sum}/{self.blocks} blocks awake"
+
+    def get_state(self, now):
+        return {
+            "awake_time": self.awake_time,
+            "run_results": list(self.run_results),
+            "block_index": self.block_index,
+            "block_elapsed": now - self.block_start_time,
+            "block_frame_count": self.block_frame_count,
+            "block_hit_count": self.block_hit_count,
+        }
+
+    def restore_state(self, state, now):
+        self.reset(now, state["awake_time"])
+        if len(state["run_results"]) != self.blocks:
+            return
+        self.run_results = list(state["run_results"])
+        self.success_sum = sum(self.run_results)
+        self.block_index = state["block_index"]
+        self.block_start_time = now - state["block_elapsed"]
+        self.block_frame_count = state["block_frame_count"]
+        self.block_hit_count = state["block_hit_count"]
+
+
+class SlidingWindowPolicy:
+    name = "sliding"
+
+    def __init__(self, window_seconds=300.0, refire_interval=15.0, max_frame_gap=1.0):
+        """
+        window_seconds => how far back to look (20 x 15s blocks by default)
+        refire_interval => minimum seconds between alerts while above threshold
+        max_frame_gap => a frame never counts for more than this many seconds
+            (so a stalled camera doesn't turn one frame into a long awake stretch)
+        """
+        self.window_seconds = window_seconds
+        self.refire_interval = refire_interval
+        self.max_frame_gap = max_frame_gap
+        self.awake_time = 30
+        self.reset(0.0)
+
+    def reset(self, now, awake_time=None):
+        if awake_time is not None:
+            self.awake_time = awake_time
+        self.frames = deque()     # (timestamp, duration, hit_duration)
+        self.total_time = 0.0
+        self.hit_time = 0.0
+        self.last_time = now
+        self.last_fired = None
+
+    def update(self, now, hit):
+        duration = min(max(now - self.last_time, 0.0), self.max_frame_gap)
+        self.last_time = now
+        hit_duration = duration if hit else 0.0
+        self.frames.append((now, duration, hit_duration))
+        self.total_time += duration
+        self.hit_time += hit_duration
+
+        # Drop frames that left the window - each frame is added and removed once
+        horizon = now - self.window_seconds
+        frames = self.frames
+        while frames and frames[0][0] <= horizon:
+            _, d, h = frames.popleft()
+            self.total_time -= d
+            self.hit_time -= h
+        if not frames:
+            # Avoid float drift accumulating over a whole night
+            self.total_time = 0.0
+            self.hit_time = 0.0
+
+        if self.hit_time < self.awake_time:
+            self.last_fired = None
+            return (False, None)
+        if self.last_fired is not None and now - self.last_fired < self.refire_interval:
+            return (False, None)
+        self.last_fired = now
+        return (True, {"hit_seconds": round(self.hit_time, 1), "window_seconds": round(self.total_time, 1)})
+
+    def window_summary(self):
+        return f"{self.hit_time:.0f}s awake in last {self.total_time:.0f}s"
+
+    def get_state(self, now):
+        return {
+            "awake_time": self.awake_time,
+            "frames": [(round(t - now, 3), round(d, 3), round(h, 3)) for (t, d, h) in self.frames],
+            "last_fired": None if self.last_fired is None else self.last_fired - now,
+        }
+
+    def restore_state(self, state, now):
+        self.reset(now, state["awake_time"])
+        for (age, d, h) in state["frames"]:
+            self.frames.append((now + age, d, h))
+            self.total_time += d
+            self.hit_time += h
+        if state["last_fired"] is not None:
+            self.last_fired = now + state["last_fired"]
+
+
+ALERT_POLICIES = {
+    "block": BlockPolicy,
+    "sliding": SlidingWindowPolicy,
+}
+
+
+def make_alert_policy(policy, **kwargs):
+    """
+    'policy' is a name from ALERT_POLICIES or an already-built policy object.
+    """
+    if not isinstance(policy, str):
+        return policy
+    if policy not in ALERT_POLICIES:
+        raise ValueError(f"Unknown alert policy '{policy}' (choose from {', '.join(ALERT_POLICIES)})")
+    return ALERT_POLICIES[policy](**kwargs)
@@ -0,0 +1,307 @@
+# alert_player.py
+"""
+Alert sound playback on its own thread, with bounded latency.
+
+The alert sounds are decoded into memory once, when the player starts, so an
+alert only has to start a channel: no stop/load of the MP3 from disk, no work
+on the caller's thread (alert() just queues a request). The time from alert()
+to the sound starting is logged as "alert played" latency_ms.
+
+An alert that isn't acknowledged (acknowledge(), e.g. the Stop button) is
+repeated every 'repeat_interval' seconds, each time louder by 'volume_step'
+(up to full volume), up to 'max_repeats' times (None => until acknowledged).
+Further alert() calls while one is pending (run mode fires one per 15s block)
+don't restart it: the repeat schedule and its escalation keep going.
+
+The default output device is watched by DeviceWatcher (a cheap poll on its own
+thread); the mixer is only re-opened when the device actually changed, never
+per alert. Sinks:
+    PygameSink - pygame.mixer Sound objects (the alert is mixed on a channel)
+    NullSink   - plays nothing, remembers what it was asked to play (testing, headless boxes)
+"""
+
+import queue
+import sys
+import threading
+import time
+
+from event_log import get_event_log
+
+
+class NullSink:
+    """
+    Audio sink that plays nothing. 'plays' lists (time, name, volume) of every play().
+    """
+
+    def __init__(self):
+        self.plays = []
+        self.reinits = 0
+        self.playing = False
+
+    def load(self, name, path):
+        pass
+
+    def play(self, name, volume):
+        self.plays.append((time.monotonic(), name, volume))
+        self.playing = True
+
+    def stop(self):
+        self.playing = False
+
+    def reinit(self):
+        self.reinits += 1
+
+    def close(self):
+        self.playing = False
+
+
+class PygameSink:
+    """
+    Sounds decoded into memory with pygame.mixer.Sound; pygame is imported on first load.
+    """
+
+    def __init__(self):
+        self._mixer = None
+        self._paths = {}
+        self._sounds = {}
+        self._channel = None
+
+    def _open(self):
+        import pygame
+        if not pygame.mixer.get_init():
+            pygame.mixer.init()
+        self._mixer = pygame.mixer
+
+    def load(self, name, path):
+        if self._mixer is None:
+            self._open()
+        self._paths[name] = path
+        self._sounds[name] = self._mixer.Sound(path)
+
+    def play(self, name, volume):
+        sound = self._sounds[name]
+        sound.set_volume(volume)
+        if self._channel is not None:
+            self._channel.stop()
+        self._channel = sound.play()
+
+    def stop(self):
+        if self._channel is not None:
+            self._channel.stop()
+            self._channel = None
+
+    def reinit(self):
+        """
+        Re-open the mixer on the (new) default device and decode the sounds again.
+        """
+        self.stop()
+        if self._mixer is not None:
+            self._mixer.quit()
+        self._open()
+        for name, path in self._paths.items():
+            self._sounds[name] = self._mixer.Sound(path)
+
+    def close(self):
+        self.stop()
+        self._sounds.clear()
+        if self._mixer is not None:
+            self._mixer.quit()
+            self._mixer = None
+
+
+def default_output_device_name():
+    """
+    Name of the current default output device, or None:
+    Windows core audio (pycaw) first, then sounddevice's default output, then
+    the first name in SDL's device list. sounddevice reports the device list
+    PortAudio saw at import (a device plugged in later only shows up after a
+    restart); SDL sees hotplugs, but its first device is only the first one
+    listed, not necessarily the system default.
+    """
+    if sys.platform == "win32":
+        try:
+            from pycaw.pycaw import AudioUtilities
+            return AudioUtilities.CreateDevice(AudioUtilities.GetSpeakers()).FriendlyName
+        except Exception:
+            pass
+    try:
+        import sounddevice as sd
+        return sd.query_devices(kind="output")["name"]
+    except Exception:
+        pass
+    try:
+        from pygame._sdl2 import audio as sdl_audio
+        names = sdl_audio.get_audio_device_names(False)
+        if names:
+            return names[0]
+    except Exception:
+        pass
+    return None
+
+
+class DeviceWatcher:
+    """
+    Polls probe() every 'interval' seconds on a daemon thread and calls
+    on_change(name) when the default output device changes (and once at start).
+    """
+
+    def __init__(self, on_change, probe=default_output_device_name, interval=3.0):
+        self.on_change = on_change
+        self.probe = probe
+        self.interval = interval
+        self.device = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="DeviceWatcher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        if sys.platform == "win32":
+            try:
+                import comtypes
+                comtypes.CoInitialize()
+            except Exception:
+                pass
+        first = True
+        while not self._stop.is_set():
+            name = self.probe()
+            if first or name != self.device:
+                old, self.device = self.device, name
+                self.on_change(name, old)
+                first = False
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+
+
+class AlertPlayer:
+    def __init__(self, sounds, sink=None, volume=1.0, volume_step=0.15, repeat_interval=20.0,
+                 max_repeats=None, watch_devices=True, event_log=None, clock=time.monotonic):
+        """
+        sounds => {"name": path}; the first one is the default alert
+        sink => PygameSink() by default, NullSink() for tests / no audio
+        volume => first play volume (0..1), full volume like the old playback by default;
+            below 1.0 leaves room for each unacknowledged repeat to add volume_step
+        repeat_interval => seconds before an unacknowledged alert is played again
+        max_repeats => repeats before giving up (None => until acknowledged)
+        watch_devices => re-open the sink when the default output device changes
+        """
+        self.sounds = dict(sounds)
+        self.default_sound = next(iter(self.sounds))
+        self.sink = sink if sink is not None else PygameSink()
+        self.volume = volume
+        self.volume_step = volume_step
+        self.repeat_interval = repeat_interval
+        self.max_repeats = max_repeats
+        self.log = event_log if event_log is not None else get_event_log()
+        self.clock = clock
+
+        self.ready = threading.Event()
+        self.device = None
+        self.last_latency_ms = None
+        self.pending = None        # {"sound", "volume", "repeats", "next_time"} while unacknowledged
+        self.on_device_change = None   # optional callback(name), e.g. for a GUI label
+
+        self._requests = queue.Queue()
+        self._thread = None
+        self._watcher = DeviceWatcher(self._device_changed) if watch_devices else None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="AlertPlayer", daemon=True)
+        self._thread.start()
+        if self._watcher is not None:
+            self._watcher.start()
+
+    # ----------------- Called from any thread -----------------
+    def alert(self, sound=None):
+        """
+        Start an alert (non-blocking). Repeats louder until acknowledge().
+        """
+        self._requests.put(("alert", sound or self.default_sound, self.clock()))
+
+    def acknowledge(self):
+        """
+        Stop the sound and any escalation.
+        """
+        self._requests.put(("ack", None, self.clock()))
+
+    def stop(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+        self._requests.put(("stop", None, self.clock()))
+        if self._thread is not None:
+            self._thread.join(2.0)
+
+    def _device_changed(self, name, old):
+        self.device = name
+        if old is not None:
+            self._requests.put(("device", name, self.clock()))
+        if self.on_device_change is not None:
+            self.on_device_change(name)
+
+    # ----------------- Worker thread -----------------
+    def _run(self):
+        for name, path in self.sounds.items():
+            try:
+                self.sink.load(name, path)
+            except Exception as e:
+                self.log.error("AlertPlayer", f"Cannot load alert sound {path}", error=e)
+        self.ready.set()
+
+        while True:
+            timeout = None
+            if self.pending is not None:
+                timeout = max(0.0, self.pending["next_time"] - self.clock())
+            try:
+                kind, arg, requested = self._requests.get(timeout=timeout)
+            except queue.Empty:
+                self._escalate()
+                continue
+
+            if kind == "stop":
+                self.sink.close()
+                return
+            if kind == "alert":
+                if self.pending is not None:
+                    # Already sounding and escalating - don't push the next repeat back
+                    continue
+                self.pending = {"sound": arg, "volume": self.volume, "repeats": 0}
+                self._play(requested)
+            elif kind == "ack":
+                if self.pending is not None:
+                    self.log.info("AlertPlayer", "alert acknowledged", repeats=self.pending["repeats"])
+                self.pending = None
+                self.sink.stop()
+            elif kind == "device":
+                self.log.info("AlertPlayer", "output device changed", device=arg)
+                try:
+                    self.sink.reinit()
+                except Exception as e:
+                    self.log.error("AlertPlayer", "Cannot re-open audio output", error=e)
+
+    def _play(self, requested):
+        pending = self.pending
+        try:
+            self.sink.play(pending["sound"], pending["volume"])
+        except Exception as e:
+            self.log.error("AlertPlayer", f"Error playing {pending['sound']}", error=e)
+        self.last_latency_ms = (self.clock() - requested) * 1000.0
+        pending["next_time"] = self.clock() + self.repeat_interval
+        self.log.info("AlertPlayer", "alert played", sound=pending["sound"],
+                      volume=round(pending["volume"], 2), latency_ms=round(self.last_latency_ms, 1))
+
+    def _escalate(self):
+        pending = self.pending
+        if self.max_repeats is not None and pending["repeats"] >= self.max_repeats:
+            self.log.warning("AlertPlayer", "alert never acknowledged, giving up", repeats=pending["repeats"])
+            self.pending = None
+            return
+        pending["repeats"] += 1
+        pending["volume"] = min(1.0, pending["volume"] + self.volume_step)
+        self.log.warning("AlertPlayer", "alert not acknowledged, repeating louder", repeats=pending["repeats"])
+        self._play(self.clock())
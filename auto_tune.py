@@ -0,0 +1,150 @@
+# auto_tune.py
+"""
+Tune the cascade settings to this patient and this lighting.
+
+Uses the grayscale frames EyeDetector kept during setup_open and setup_closed
+(the frames are labelled by the setup they came from). The search runs in two
+stages on a process pool:
+
+1) face: every (detection_scale, scaleFactor, minNeighbors) combination is run
+   on all frames; candidates must find a face in at least 'face_target' of them.
+2) eye: for each qualifying face setting, cheapest first, every eye
+   (scaleFactor, minNeighbors) combination is run on that setting's faces;
+   candidates must reach 'open_target' on the open frames and 'closed_target'
+   on the closed frames (same 0.8 as the setup modes).
+
+The cheapest (face + eye ms per frame) qualifying combination wins. Face
+settings whose face stage alone costs more than the best combination so far
+are not tried. If nothing qualifies, the result says so and the current
+settings stay.
+"""
+
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+FACE_GRID = {
+    "detection_scale": (1.0, 0.75, 0.5, 0.35),
+    "scale_factor": (1.05, 1.1, 1.2, 1.3),
+    "min_neighbors": (3, 5, 7),
+}
+
+EYE_GRID = {
+    "scale_factor": (1.05, 1.1, 1.2),
+    "min_neighbors": (3, 5, 7),
+}
+
+# Set once per worker process by _init_worker
+_frames = None
+_min_side = None
+_face_path = None
+_eye_path = None
+
+
+def _init_worker(frames, min_side, face_path, eye_path):
+    global _frames, _min_side, _face_path, _eye_path
+    _frames = frames
+    _min_side = min_side
+    _face_path = face_path
+    _eye_path = eye_path
+
+
+def _try_face(params):
+    """
+    Returns (params, faces per frame, ms per frame).
+    """
+    from detector_backends import CascadeFaceBackend
+
+    backend = CascadeFaceBackend(path=_face_path, **params)
+    t0 = time.perf_counter()
+    faces = [backend.detect_faces(gray, _min_side) for gray, _ in _frames]
+    ms = (time.perf_counter() - t0) * 1000.0 / max(len(_frames), 1)
+    return params, faces, ms
+
+
+def _try_eye(args):
+    """
+    Returns (params, open accuracy, closed accuracy, ms per frame) for the given faces.
+    """
+    from detector_backends import CascadeEyeBackend, eye_region
+
+    params, faces_per_frame = args
+    backend = CascadeEyeBackend(path=_eye_path, **params)
+    open_hits = open_total = closed_hits = closed_total = 0
+    t0 = time.perf_counter()
+    for (gray, label), faces in zip(_frames, faces_per_frame):
+        eyes_open = False
+        for face in faces:
+            if backend.eyes_open(gray, eye_region(face))[0]:
+                eyes_open = True
+                break
+        if label == "setup_open":
+            open_total += 1
+            open_hits += eyes_open
+        else:
+            closed_total += 1
+            closed_hits += bool(faces) and not eyes_open
+    ms = (time.perf_counter() - t0) * 1000.0 / max(len(_frames), 1)
+    open_acc = open_hits / open_total if open_total else 0.0
+    closed_acc = closed_hits / closed_total if closed_total else 0.0
+    return params, open_acc, closed_acc, ms
+
+
+def _grid(grid):
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def tune(detector, open_target=0.8, closed_target=0.8, face_target=0.9, workers=None):
+    """
+    Search cascade settings on detector.calibration_frames. Returns a dict:
+    {"ok", "face", "eye", "open_accuracy", "closed_accuracy", "ms_per_frame", "reason"}
+    ready for detector.apply_tuning() when ok is True.
+    """
+    frames = [(gray, mode) for mode in ("setup_open", "setup_closed")
+              for gray in detector.calibration_frames.get(mode, [])]
+    if not detector.calibration_frames.get("setup_open") or not detector.calibration_frames.get("setup_closed"):
+        return {"ok": False, "reason": "run both setups first"}
+    if not hasattr(detector.face_backend, "scale_factor") or not hasattr(detector.eye_backend, "scale_factor"):
+        return {"ok": False, "reason": "only cascade backends can be tuned"}
+
+    min_side = detector.min_face_size(frames[0][0].shape[0])
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        initializer=_init_worker,
+        initargs=(frames, min_side, detector.face_backend.path, detector.eye_backend.path)
+    ) as pool:
+        # Stage 1: face settings that still find the face
+        face_candidates = []
+        for params, faces, ms in pool.map(_try_face, _grid(FACE_GRID)):
+            found = sum(1 for f in faces if f) / float(len(frames))
+            if found >= face_target:
+                face_candidates.append((ms, params, faces))
+        if not face_candidates:
+            return {"ok": False, "reason": f"no face setting finds the face in {face_target:.0%} of frames"}
+        face_candidates.sort(key=lambda c: c[0])
+
+        # Stage 2: eye settings on each face setting's faces, cheapest face setting first
+        best = None
+        for face_ms, face_params, faces in face_candidates:
+            if best is not None and face_ms >= best["ms_per_frame"]:
+                break
+            for params, open_acc, closed_acc, ms in pool.map(_try_eye, [(p, faces) for p in _grid(EYE_GRID)]):
+                if open_acc < open_target or closed_acc < closed_target:
+                    continue
+                if best is None or face_ms + ms < best["ms_per_frame"]:
+                    best = {
+                        "ok": True,
+                        "face": face_params,
+                        "eye": params,
+                        "open_accuracy": round(open_acc, 3),
+                        "closed_accuracy": round(closed_acc, 3),
+                        "ms_per_frame": face_ms + ms,
+                        "reason": "",
+                    }
+        if best is None:
+            return {"ok": False, "reason": "no face/eye setting meets the open/closed targets"}
+
+    best["ms_per_frame"] = round(best["ms_per_frame"], 2)
+    return best
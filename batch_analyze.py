@@ -0,0 +1,186 @@
+# batch_analyze.py
+"""
+Parallel batch analysis of a night-long recording.
+
+The video is split into time chunks, each chunk is analysed on a process pool
+(every worker builds its own EyeDetector, i.e. loads the cascades once), and the
+per-frame results are merged back in order. Frames go through process_frame in
+run mode on a clock following the video, so face tracking, the motion gate and
+the patient tracker act as they do live (the tracker passes every face through:
+a recording has no setups to learn the patient from). The 15-second block / FIFO
+alert decisions of "run" mode are then reproduced by feeding the merged results
+through EyeDetector.apply_result on a simulated clock.
+
+Output (.npz): frame, time, state (see STATE_CODES), faces, face box (x, y, w, h)
+per frame, plus the frame indices where run mode would have played the song.
+
+Example:
+    python batch_analyze.py night1.mp4 --out night1.npz --workers 8
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from cv_close_eye_detect import EyeDetector, STATE_CODES
+from event_log import EventLog
+from replay import SimulatedClock, source_fps
+
+# Set once per worker process by _init_worker
+_worker_detector = None
+
+
+def _init_worker(detector_kwargs):
+    global _worker_detector
+    # One log file per worker: processes must not append to (and rotate) the same file
+    log = EventLog(path=f"eye_events_batch_{os.getpid()}.log")
+    _worker_detector = EyeDetector(clock=SimulatedClock(), draw_boxes=False, event_log=log, **detector_kwargs)
+
+
+def _analyse_chunk(args):
+    """
+    Runs in a worker process. Returns (start, rows) where each row is
+    (frame_index, state_code, n_faces, x, y, w, h) of the face the eyes were checked in
+    (else the first face).
+    """
+    path, start, end, step, flip, fps = args
+    detector = _worker_detector
+    # Every chunk starts like a fresh run (full-frame detection, no motion history)
+    detector.clock.now = start / fps
+    detector.start_detection("run")
+
+    rows = []
+    cap = cv2.VideoCapture(path)
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        for index in range(start, end):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if (index - start) % step:
+                continue
+            if flip:
+                frame = cv2.flip(frame, 1)
+            detector.clock.now = index / fps
+            detector.process_frame(frame)
+            faces = detector.last_faces
+            x, y, w, h = detector.last_face or (faces[0] if len(faces) else (0, 0, 0, 0))
+            rows.append((index, STATE_CODES[detector.last_state], len(faces), x, y, w, h))
+    finally:
+        cap.release()
+    return start, rows
+
+
+def split_chunks(frame_count, chunk_frames):
+    return [(start, min(start + chunk_frames, frame_count))
+            for start in range(0, frame_count, chunk_frames)]
+
+
+def analyse_video(path, workers=None, chunk_seconds=300, step=1, flip=False,
+                  detector_kwargs=None):
+    """
+    Per-frame results of the whole video as a dict of numpy arrays, in frame order.
+    'step' analyses every step-th frame (e.g. 3 => 30 fps footage at 10 fps).
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video: {path}")
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    fps = source_fps(path)
+
+    # Chunk length is a multiple of 'step' so subsampling is identical to a single pass
+    chunk_frames = int(round(chunk_seconds * fps))
+    chunk_frames = max(step, chunk_frames - chunk_frames % step)
+    chunks = split_chunks(frame_count, chunk_frames)
+
+    tasks = [(path, start, end, step, flip, fps) for start, end in chunks]
+    rows = []
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        initializer=_init_worker,
+        initargs=(detector_kwargs or {},)
+    ) as pool:
+        # map() yields in submission order => chunks come back already sorted
+        for _, chunk_rows in pool.map(_analyse_chunk, tasks):
+            rows.extend(chunk_rows)
+
+    table = np.array(rows, dtype=np.int32).reshape(-1, 7)
+    return {
+        "frame": table[:, 0],
+        "time": table[:, 0].astype(np.float64) / fps,
+        "state": table[:, 1].astype(np.uint8),
+        "faces": table[:, 2].astype(np.uint8),
+        "box": table[:, 3:7].astype(np.int16),
+        "fps": fps,
+    }
+
+
+def replay_run_decisions(times, states, awake_time=30, alert_policy="block"):
+    """
+    Reproduce run mode's alert decisions (15s block / FIFO by default) from
+    per-frame results. Returns the indices (into times/states) where status 2
+    would have fired.
+    """
+    clock = SimulatedClock(float(times[0]) if len(times) else 0.0)
+    detector = EyeDetector(tracking=False, clock=clock, alert_policy=alert_policy)
+    detector.start_detection("run", awake_time=awake_time)
+
+    alerts = []
+    no_face_code = STATE_CODES["no_face"]
+    open_code = STATE_CODES["open"]
+    rejected_code = STATE_CODES["face_rejected"]
+    for i, (t, state) in enumerate(zip(times, states)):
+        clock.now = float(t)
+        status, _ = detector.apply_result(state in (no_face_code, rejected_code), state == open_code,
+                                          rejected=state == rejected_code)
+        if status == 2:
+            alerts.append(i)
+    return alerts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse a recording on all CPU cores")
+    parser.add_argument("video")
+    parser.add_argument("--out", required=True, help="per-frame results file (.npz)")
+    parser.add_argument("--workers", type=int, default=None, help="default: one per core")
+    parser.add_argument("--chunk-seconds", type=float, default=300)
+    parser.add_argument("--step", type=int, default=1, help="analyse every step-th frame")
+    parser.add_argument("--awake-time", type=int, default=30)
+    parser.add_argument("--flip", action="store_true")
+    parser.add_argument("--alert-policy", default="block", choices=("block", "sliding"))
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    results = analyse_video(
+        args.video, workers=args.workers, chunk_seconds=args.chunk_seconds,
+        step=args.step, flip=args.flip
+    )
+    elapsed = time.perf_counter() - t0
+
+    alerts = replay_run_decisions(results["time"], results["state"], args.awake_time,
+                                  args.alert_policy)
+    alert_frames = results["frame"][alerts] if alerts else np.zeros(0, dtype=np.int32)
+
+    np.savez_compressed(
+        args.out,
+        frame=results["frame"],
+        time=results["time"],
+        state=results["state"],
+        faces=results["faces"],
+        box=results["box"],
+        alert_frames=alert_frames,
+        fps=results["fps"],
+        awake_time=args.awake_time,
+    )
+    n = len(results["frame"])
+    print(f"[batch] {n} frames in {elapsed:.1f}s ({n / elapsed if elapsed else 0:.1f} fps), "
+          f"{len(alert_frames)} alerts => {args.out}")
+
+
+if __name__ == "__main__":
+    main()
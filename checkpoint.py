@@ -0,0 +1,121 @@
+# checkpoint.py
+"""
+Save the monitoring state to disk so a restart can continue where it stopped.
+
+A checkpoint is one small JSON file: the EyeDetector part (setup results, tuned
+cascade settings, run mode and its alert window, see EyeDetector.get_checkpoint)
+plus the app's own settings (awake time, delay, alert policy choice).
+
+Writes are atomic: the JSON goes to a temporary file next to the checkpoint,
+is fsync'ed, then renamed over it, so a crash or power cut leaves either the
+old or the new checkpoint, never half of one. Checkpointer takes a snapshot
+every 'interval' seconds on its own thread and only writes when it changed.
+
+load_checkpoint() ignores checkpoints older than 'max_age' seconds: after a
+long outage the caregiver should set things up again.
+"""
+
+import json
+import os
+import threading
+import time
+
+from event_log import get_event_log
+
+CHECKPOINT_VERSION = 1
+DEFAULT_PATH = "eye_checkpoint.json"
+
+
+def save_checkpoint(state, path=DEFAULT_PATH):
+    data = json.dumps(
+        {"version": CHECKPOINT_VERSION, "saved_at": time.time(), "state": state},
+        separators=(",", ":")
+    )
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path=DEFAULT_PATH, max_age=600.0):
+    """
+    The saved state dict, or None if there is none, it's unreadable or too old.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        get_event_log().warning("checkpoint", "Ignoring unreadable checkpoint", path=path, error=e)
+        return None
+    if data.get("version") != CHECKPOINT_VERSION:
+        return None
+    age = time.time() - data.get("saved_at", 0.0)
+    if age > max_age:
+        get_event_log().info("checkpoint", "Checkpoint too old, not resuming", age_s=round(age))
+        return None
+    return data["state"]
+
+
+def clear_checkpoint(path=DEFAULT_PATH):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class Checkpointer:
+    """
+    Calls snapshot_fn() every 'interval' seconds and saves the result when it differs
+    from the last one saved. request_save() makes the thread save right away
+    (e.g. after a setup finished) without writing on the caller's thread.
+    """
+
+    def __init__(self, snapshot_fn, path=DEFAULT_PATH, interval=5.0):
+        self.snapshot_fn = snapshot_fn
+        self.path = path
+        self.interval = interval
+        self.saves = 0
+        self._last_saved = None
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="Checkpointer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopping:
+                return
+            self.save_now()
+
+    def request_save(self):
+        self._wake.set()
+
+    def save_now(self):
+        with self._lock:
+            try:
+                state = self.snapshot_fn()
+                if state == self._last_saved:
+                    return
+                save_checkpoint(state, self.path)
+                self._last_saved = state
+                self.saves += 1
+            except Exception as e:
+                get_event_log().error("checkpoint", "Cannot write checkpoint", path=self.path, error=e)
+
+    def stop(self, final_save=True):
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(2.0)
+        if final_save:
+            self.save_now()
@@ -0,0 +1,223 @@
+# clip_recorder.py
+"""
+Short video clips around alerts, instead of recording the whole night.
+
+The last 'pre_seconds' of frames are kept JPEG-compressed in a ring of slots
+that are all allocated up front (one numpy block) and overwritten in turn. On
+trigger() - an alert, or a no-face stretch longer than 'no_face_seconds' -
+the pre-roll is taken out of the ring, 'post_seconds' more frames are added,
+and the clip is written to 'out_dir' as an MJPG .avi by a writer thread.
+
+add_frame() only hands the frame over (latest-wins); resizing and encoding
+happen on the recorder's own thread at 'fps', so detection and the GUI never
+wait on it.
+"""
+
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from event_log import get_event_log
+from pipeline import LatestQueue
+
+
+class ClipRecorder:
+    def __init__(self, out_dir="clips", pre_seconds=30.0, post_seconds=15.0, fps=5.0,
+                 size=(640, 480), jpeg_quality=80, slot_bytes=128 * 1024,
+                 no_face_seconds=120.0, event_log=None):
+        """
+        size => clip frame size (frames are resized to it before encoding)
+        slot_bytes => room for one JPEG; a frame that doesn't fit is re-encoded at
+            lower quality, then dropped
+        no_face_seconds => also record a clip when no face is seen for this long (None => never)
+        """
+        self.out_dir = out_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.fps = fps
+        self.size = size
+        self.jpeg_quality = jpeg_quality
+        self.no_face_seconds = no_face_seconds
+        self.log = event_log if event_log is not None else get_event_log()
+
+        # Ring of preallocated JPEG slots
+        self.capacity = max(1, int(pre_seconds * fps))
+        self._slots = np.zeros((self.capacity, slot_bytes), dtype=np.uint8)
+        self._lengths = np.zeros(self.capacity, dtype=np.int32)
+        self._times = np.zeros(self.capacity, dtype=np.float64)
+        self._count = 0             # frames ever stored (next slot = _count % capacity)
+        self._small = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+
+        self._frames = LatestQueue()
+        self._triggers = queue.Queue()
+        self._writes = queue.Queue()
+        self._clip = None           # clip being collected: {"reason", "end_time", "frames"}
+
+        self._no_face_since = None
+        self._no_face_triggered = False
+
+        self.dropped_frames = 0
+        self.clips_written = 0
+        self._running = False
+        self._threads = []
+
+    def start(self):
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._encode_loop, name="ClipEncoder", daemon=True),
+            threading.Thread(target=self._write_loop, name="ClipWriter", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        """
+        Stop recording; a clip being collected is written with what it has.
+        """
+        self._running = False
+        self._threads[0].join(2.0)
+        if self._clip is not None:
+            self._writes.put(self._clip)
+            self._clip = None
+        self._writes.put(None)
+        self._threads[1].join(10.0)
+
+    # ----------------- Called from the GUI / headless loop -----------------
+    def add_frame(self, frame, faces=None, now=None):
+        """
+        Offer a frame (BGR, not modified afterwards). Never blocks.
+        """
+        self._frames.put((frame, faces, time.time() if now is None else now))
+
+    def trigger(self, reason, now=None):
+        self._triggers.put((reason, time.time() if now is None else now))
+
+    def observe_state(self, state, now=None):
+        """
+        Feed EyeDetector.last_state; triggers once per no-face stretch longer than no_face_seconds.
+        """
+        if self.no_face_seconds is None:
+            return
+        now = time.time() if now is None else now
+        if state != "no_face":
+            self._no_face_since = None
+            self._no_face_triggered = False
+        elif self._no_face_since is None:
+            self._no_face_since = now
+        elif not self._no_face_triggered and now - self._no_face_since >= self.no_face_seconds:
+            self._no_face_triggered = True
+            self.trigger("no_face", now)
+
+    # ----------------- Encoder thread -----------------
+    def _encode_loop(self):
+        width, height = self.size
+        interval = 1.0 / self.fps
+        last = 0.0
+        while self._running:
+            item = self._frames.get(timeout=0.2)
+            self._check_triggers()
+            clip = self._clip
+            if clip is not None and time.time() > clip["end_time"] + 1.0:
+                # No more frames coming (detection stopped) => write what we have
+                self._writes.put(clip)
+                self._clip = None
+            if item is None:
+                continue
+            frame, faces, now = item
+            if now - last < interval:
+                continue
+            last = now
+
+            cv2.resize(frame, (width, height), dst=self._small, interpolation=cv2.INTER_AREA)
+            if faces:
+                sx = width / float(frame.shape[1])
+                sy = height / float(frame.shape[0])
+                for (x, y, w, h) in faces:
+                    cv2.rectangle(self._small, (int(x * sx), int(y * sy)),
+                                  (int((x + w) * sx), int((y + h) * sy)), (0, 255, 0), 2)
+            cv2.putText(self._small, time.strftime("%H:%M:%S", time.localtime(now)), (8, 24),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            self._store(now)
+
+    def _store(self, now):
+        slot_bytes = self._slots.shape[1]
+        for quality in (self.jpeg_quality, self.jpeg_quality // 2):
+            ok, jpeg = cv2.imencode(".jpg", self._small, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+            if ok and len(jpeg) <= slot_bytes:
+                break
+        else:
+            self.dropped_frames += 1
+            return
+
+        i = self._count % self.capacity
+        n = len(jpeg)
+        self._slots[i, :n] = jpeg.ravel()
+        self._lengths[i] = n
+        self._times[i] = now
+        self._count += 1
+
+        clip = self._clip
+        if clip is not None:
+            clip["frames"].append((now, self._slots[i, :n].tobytes()))
+            if now >= clip["end_time"]:
+                self._writes.put(clip)
+                self._clip = None
+
+    def _check_triggers(self):
+        while True:
+            try:
+                reason, now = self._triggers.get_nowait()
+            except queue.Empty:
+                return
+            if self._clip is not None:
+                # Already recording => just make it longer
+                self._clip["end_time"] = now + self.post_seconds
+                continue
+            self._clip = {"reason": reason, "time": now, "end_time": now + self.post_seconds,
+                          "frames": self._pre_roll(now)}
+
+    def _pre_roll(self, now):
+        """
+        Copy of the ring's frames from the last pre_seconds before 'now', oldest first.
+        """
+        n = min(self._count, self.capacity)
+        start = self._count - n
+        frames = []
+        for k in range(start, self._count):
+            i = k % self.capacity
+            if now - self._times[i] > self.pre_seconds:
+                continue
+            frames.append((float(self._times[i]), self._slots[i, :self._lengths[i]].tobytes()))
+        return frames
+
+    # ----------------- Writer thread -----------------
+    def _write_loop(self):
+        while True:
+            clip = self._writes.get()
+            if clip is None:
+                return
+            try:
+                self._write_clip(clip)
+            except Exception as e:
+                self.log.error("ClipRecorder", "Cannot write clip", reason=clip["reason"], error=e)
+
+    def _write_clip(self, clip):
+        if not clip["frames"]:
+            return
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(clip["time"]))
+        path = os.path.join(self.out_dir, f"clip_{stamp}_{clip['reason']}.avi")
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), self.fps, self.size)
+        try:
+            for _, jpeg in clip["frames"]:
+                writer.write(cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR))
+        finally:
+            writer.release()
+        self.clips_written += 1
+        self.log.info("ClipRecorder", "clip written", path=path, reason=clip["reason"],
+                      frames=len(clip["frames"]),
+                      seconds=round(clip["frames"][-1][0] - clip["frames"][0][0], 1))
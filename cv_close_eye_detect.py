@@ -1,77 +1,411 @@
 import cv2
+import threading
 import time
 
+from alert_engine import make_alert_policy
+from detector_backends import eye_region, make_eye_backend, make_face_backend
+from event_log import get_event_log
+from eye_classifier import ClassifierEyeBackend, EyeStateClassifier, model_path, train_eye_classifier
+from face_tracker import FaceTracker
+from motion_gate import MotionGate
+from patient_tracker import PatientTracker
+from sequential_test import SequentialRatioTest
+from perf_stats import get_stage_timer
+
+# Compact per-frame state codes, for stored results (see batch_analyze.py)
+STATE_CODES = {"no_face": 0, "closed": 1, "open": 2, "face_rejected": 3}
+
+
 class EyeDetector:
-    def __init__(self):
-        # Paths to Haar cascades
-        self.face_cascade_path = "./haarcascade_frontalface_alt.xml"
-        self.eye_cascade_path = "./haarcascade_eye_tree_eyeglasses.xml"
+    def __init__(self, tracking=True, redetect_interval=10, track_margin=0.5,
+                 detection_scale=0.5, expected_face_frac=0.3, clock=time.time,
+                 event_log=None, stage_timer=None, alert_policy="block", draw_boxes=True,
+                 face_backend="haar", eye_backend="eye_tree", motion_gate=True, motion_max_skip=1.0,
+                 patient_tracking=True, early_setup=True, min_setup_seconds=3.0,
+                 eye_classifier=True, patient_id=None, model_dir="eye_models"):
+        """
+        tracking => search only around the last face between full-frame detections
+        redetect_interval => frames between forced full-frame face detections
+        track_margin => how much (fraction of face size) to expand the search window
+        detection_scale => cascade face backends run on the grayscale image resized by
+            this factor (1.0 => native resolution); eyes are still searched at full resolution
+        expected_face_frac => expected face height as a fraction of the frame height
+            (patient right in front, at arm's length). minSize is derived from it;
+            None => the old fixed minSize=(30, 30)
+        clock => returns the current time in seconds; replay.py passes a simulated clock
+        event_log => EventLog to report to (default: the process-wide one)
+        stage_timer => StageTimer for per-stage durations (default: the process-wide one)
+        alert_policy => run-mode decision policy: "block" (15s blocks, FIFO of 20),
+            "sliding" (per-frame sliding window) or a policy object (see alert_engine.py)
+        draw_boxes => draw face boxes on the frame passed to process_frame (in place);
+            the GUI turns this off and draws them on the small preview instead
+        face_backend => "haar", "lbp", "dnn" or a backend object (see detector_backends.py)
+        eye_backend => "eye_tree", "eye" or a backend object
+        motion_gate => in run mode, skip the cascades and reuse the last result while the
+            scene is static
+        motion_max_skip => with motion_gate, detect at least this often (seconds) anyway
+        patient_tracking => learn the patient's face in the setup modes and, once learned,
+            only check that face's eyes (see patient_tracker.py)
+        early_setup => end a setup mode as soon as a sequential test settles success or
+            failure (see sequential_test.py), after at least min_setup_seconds;
+            15 seconds stays the upper bound, decided by the hit ratio as before
+        eye_classifier => after both setups succeed, train a per-patient eye-state classifier
+            on the setup eye crops and use it instead of the eye cascade in run mode,
+            if it beats the cascade on held-out crops (see eye_classifier.py)
+        patient_id => cache that classifier in model_dir under this name, and start with
+            the cached one (None => nothing is read from or written to disk)
+        """
+        self.clock = clock
+        self.log = event_log if event_log is not None else get_event_log()
+        self.timer = stage_timer if stage_timer is not None else get_stage_timer()
+
+        # Face and eye-state detectors (Haar cascades by default)
+        self.face_backend = make_face_backend(face_backend, detection_scale=detection_scale)
+        self.eye_backend = make_eye_backend(eye_backend)
 
-        self.face_cascade = cv2.CascadeClassifier(self.face_cascade_path)
-        self.eye_cascade = cv2.CascadeClassifier(self.eye_cascade_path)
+        # Expected face size => minimum face size searched for
+        self.expected_face_frac = expected_face_frac
+        self._frame_height = 0
+
+        # Face ROI tracking (None => full-frame search on every frame)
+        self.face_tracker = FaceTracker(redetect_interval, track_margin) if tracking else None
+
+        # Which face is the patient's (None => eyes checked on every face)
+        self.patient = PatientTracker() if patient_tracking else None
+
+        # Per-patient eye-state classifier for run mode (None => eye cascade)
+        self.eye_classifier = eye_classifier
+        self.patient_id = patient_id
+        self.model_dir = model_dir
+        self.classifier_backend = None
+        self.classifier_info = None
+        if eye_classifier and patient_id is not None:
+            self._load_eye_classifier()
+
+        # Static-scene detection skipping (None => detect on every frame)
+        self.motion_gate = MotionGate(max_skip=motion_max_skip) if motion_gate else None
 
         self.mode = None
         self.active = False
 
+        self.draw_boxes = draw_boxes
+
+        # Outcome of the last processed frame: "no_face", "open", "closed" or
+        # "face_rejected" (faces found, none of them the patient's)
+        self.last_state = None
+        self.last_faces = []       # every face box found in the last frame
+        self.last_face = None      # (x, y, w, h) of the face the eye decision came from
+        self.last_eye_count = 0
+
+        # Optional SessionRecorder - one record per processed frame
+        self.session_recorder = None
+
+        # Optional callable(kind, info) for state changes, run blocks, alerts and
+        # setup results (see status_server.py). Called on the detection thread,
+        # so it must not block.
+        self.event_listener = None
+        self._notified_state = None
+
+        # process_frame runs on the detection worker thread, while start/stop
+        # are called from the GUI thread
+        self.lock = threading.RLock()
+
         # For setup_open / setup_closed
         self.start_time = 0
         self.frame_count = 0
         self.hit_count = 0
+        self.setup_test = SequentialRatioTest() if early_setup else None
+        self.min_setup_seconds = min_setup_seconds
+        # Live setup progress for the GUI: {"mode", "elapsed", "ratio", "confidence"} (None outside setups)
+        self.setup_progress = None
 
-        # For run mode (15-second blocks, FIFO array)
-        self.block_start_time = 0
-        self.block_frame_count = 0
-        self.block_hit_count = 0
-        self.run_results = [0]*20
-        self.block_index = 0
+        # Grayscale frames kept from the last setup_open / setup_closed (for auto_tune.py),
+        # and whether that setup succeeded
+        self.max_calibration_frames = 60
+        self.calibration_frames = {"setup_open": [], "setup_closed": []}
+        self.calibration_results = {}
+        self._calibration_stride = 1
+        # Eye-region crops of the patient's face from the same setups (for eye_classifier.py)
+        self.max_eye_crops = 120
+        self.min_eye_crops = 12
+        self.eye_crops = {"setup_open": [], "setup_closed": []}
+        self._crop_stride = 1
+        self.tuning = None         # last params passed to apply_tuning()
+
+        # For run mode
+        self.alert_policy = make_alert_policy(alert_policy)
         self.awake_time = 30  # user-chosen
 
     def start_detection(self, mode, awake_time=30):
         """
         mode can be "setup_open", "setup_closed", or "run".
-        For run mode, we do the 15s block logic and track success/fail in a FIFO array of length 20.
+        For run mode, each frame goes to the alert policy (by default the 15s block logic
+        with success/fail tracked in a FIFO array of length 20).
         'awake_time' in seconds (30..300).
         """
-        self.mode = mode
-        self.active = True
+        with self.lock:
+            self.mode = mode
+            self.active = True
 
-        # Reset counters
-        self.start_time = time.time()
-        self.frame_count = 0
-        self.hit_count = 0
+            if self.face_tracker is not None:
+                self.face_tracker.reset()
+            if self.motion_gate is not None:
+                self.motion_gate.reset()
 
-        if mode == "run":
-            self.awake_time = awake_time
-            self.run_results = [0]*20
-            self.block_index = 0
-            self.block_start_time = time.time()
-            self.block_frame_count = 0
-            self.block_hit_count = 0
+            # Reset counters
+            self.start_time = self.clock()
+            self.frame_count = 0
+            self.hit_count = 0
 
-        print(f"[EyeDetector] Starting '{mode}' with awake_time={awake_time}")
+            self.setup_progress = None
+            if mode in self.calibration_frames:
+                if self.setup_test is not None:
+                    self.setup_test.reset(self.start_time)
+                self.calibration_frames[mode] = []
+                self._calibration_stride = 1
+                self.eye_crops[mode] = []
+                self._crop_stride = 1
+                if self.patient is not None:
+                    self.patient.start_setup(mode)
+            if self.patient is not None:
+                self.patient.reset_tracking()
+
+            if mode == "run":
+                self.awake_time = awake_time
+                self.alert_policy.reset(self.clock(), awake_time)
+
+            self.log.reset_state("eyes")
+            self.log.info("EyeDetector", f"Starting '{mode}'", awake_time=awake_time)
 
     def stop_detection(self):
         """
         Stop any active detection session and reset everything.
         """
-        self.active = False
-        self.mode = None
+        with self.lock:
+            self.active = False
+            self.mode = None
 
-        # Reset run-related
-        self.run_results = [0]*20
-        self.block_index = 0
-        self.block_start_time = 0
-        self.block_frame_count = 0
-        self.block_hit_count = 0
+            # Reset run-related
+            self.alert_policy.reset(0.0)
 
-        # Reset setup counters
-        self.start_time = 0
-        self.frame_count = 0
-        self.hit_count = 0
+            # Reset setup counters
+            self.start_time = 0
+            self.frame_count = 0
+            self.hit_count = 0
+            self.setup_progress = None
+
+    def _keep_calibration_frame(self, gray):
+        """
+        Keep at most max_calibration_frames evenly spread over the setup:
+        when the list is full, every other frame is dropped and the stride doubles.
+        """
+        if self.frame_count % self._calibration_stride:
+            return
+        frames = self.calibration_frames[self.mode]
+        frames.append(gray)
+        if len(frames) >= self.max_calibration_frames:
+            del frames[1::2]
+            self._calibration_stride *= 2
+
+    def _keep_eye_crop(self, gray, face):
+        """
+        Same thinning as _keep_calibration_frame, for the patient's eye-region crops.
+        """
+        if self.frame_count % self._crop_stride:
+            return
+        x, y, w, h = eye_region(face)
+        crops = self.eye_crops[self.mode]
+        crops.append(gray[y:y+h, x:x+w].copy())
+        if len(crops) >= self.max_eye_crops:
+            del crops[1::2]
+            self._crop_stride *= 2
+
+    def _load_eye_classifier(self):
+        path = model_path(self.model_dir, self.patient_id)
+        classifier = EyeStateClassifier.load(path)
+        if classifier is None:
+            return
+        self.classifier_info = classifier.info
+        if classifier.info.get("use"):
+            self.classifier_backend = ClassifierEyeBackend(classifier)
+        self.log.info("EyeDetector", "cached eye classifier loaded", path=path,
+                      used=bool(classifier.info.get("use")), accuracy=classifier.info.get("accuracy"))
+
+    def train_eye_classifier(self):
+        """
+        Train the per-patient classifier on the crops of the last setups and
+        compare it with the eye cascade. Returns its info dict, or None if the
+        setups gave too few crops.
+        """
+        with self.lock:
+            open_crops = self.eye_crops["setup_open"]
+            closed_crops = self.eye_crops["setup_closed"]
+            if min(len(open_crops), len(closed_crops)) < self.min_eye_crops:
+                self.log.warning("EyeDetector", "too few eye crops for a classifier",
+                                 open=len(open_crops), closed=len(closed_crops))
+                return None
+            classifier, info = train_eye_classifier(open_crops, closed_crops, cascade=self.eye_backend)
+            self.classifier_info = info
+            self.classifier_backend = ClassifierEyeBackend(classifier) if info["use"] else None
+            if self.patient_id is not None:
+                path = model_path(self.model_dir, self.patient_id)
+                try:
+                    classifier.save(path)
+                except OSError as e:
+                    self.log.error("EyeDetector", "Cannot save eye classifier", path=path, error=e)
+            self.log.info("EyeDetector", "eye classifier trained", **info)
+            return info
+
+    def apply_tuning(self, params):
+        """
+        Use tuned cascade settings (see auto_tune.py):
+        {"face": {"detection_scale", "scale_factor", "min_neighbors"},
+         "eye": {"scale_factor", "min_neighbors"}}
+        Face settings only apply to cascade face backends.
+        """
+        with self.lock:
+            self.tuning = params
+            face = params.get("face")
+            if face and hasattr(self.face_backend, "scale_factor"):
+                self.face_backend = type(self.face_backend)(path=self.face_backend.path, **face)
+            eye = params.get("eye")
+            if eye:
+                self.eye_backend = type(self.eye_backend)(
+                    path=self.eye_backend.path, min_size=self.eye_backend.min_size, **eye
+                )
+            if self.face_tracker is not None:
+                self.face_tracker.reset()
+            if self.motion_gate is not None:
+                self.motion_gate.reset()
+            self.log.info("EyeDetector", "tuning applied", **{
+                f"{stage}_{k}": v for stage in ("face", "eye") for k, v in (params.get(stage) or {}).items()
+            })
+
+    def get_checkpoint(self):
+        """
+        Everything needed to continue after a restart (see checkpoint.py), as plain data.
+        """
+        with self.lock:
+            now = self.clock()
+            return {
+                "mode": self.mode if self.active else None,
+                "awake_time": self.awake_time,
+                "calibration_results": dict(self.calibration_results),
+                "tuning": self.tuning,
+                "alert_policy": getattr(self.alert_policy, "name", None),
+                "policy_state": self.alert_policy.get_state(now) if self.mode == "run" else None,
+                "patient": self.patient.get_state() if self.patient is not None else None,
+            }
+
+    def resume_from(self, checkpoint):
+        """
+        Restore calibration, tuning and, if a run was in progress, continue the run
+        with its alert window (instead of starting from an empty one).
+        Returns True if run mode was resumed.
+        """
+        with self.lock:
+            self.calibration_results = dict(checkpoint.get("calibration_results") or {})
+            if self.patient is not None:
+                self.patient.restore_state(checkpoint.get("patient"))
+            if checkpoint.get("tuning"):
+                self.apply_tuning(checkpoint["tuning"])
+            if checkpoint.get("alert_policy"):
+                self.set_alert_policy(checkpoint["alert_policy"])
+            if checkpoint.get("mode") != "run":
+                return False
+            self.start_detection("run", awake_time=checkpoint["awake_time"])
+            if checkpoint.get("policy_state"):
+                self.alert_policy.restore_state(checkpoint["policy_state"], self.clock())
+            self.log.info("EyeDetector", "run resumed", window=self.alert_policy.window_summary())
+            return True
+
+    def attach_recorder(self, recorder):
+        """
+        Start recording every processed frame to 'recorder' (None => stop).
+        Returns the previously attached recorder so the caller can close it.
+        """
+        with self.lock:
+            old = self.session_recorder
+            self.session_recorder = recorder
+            return old
+
+    def record_session(self, path):
+        """
+        Record every processed frame to a new session file at 'path' (see session_recorder.py).
+        """
+        from session_recorder import SessionRecorder
+        old = self.attach_recorder(SessionRecorder(path))
+        if old is not None:
+            old.close()
+
+    def set_alert_policy(self, policy):
+        """
+        Switch the run-mode policy ("block", "sliding" or a policy object).
+        A run in progress restarts its window under the new policy.
+        """
+        with self.lock:
+            self.alert_policy = make_alert_policy(policy)
+            if self.mode == "run":
+                self.alert_policy.reset(self.clock(), self.awake_time)
+
+    def detect_faces(self, gray):
+        """
+        Face boxes (x, y, w, h) in full-frame coordinates, using the tracker if enabled.
+        """
+        self._frame_height = gray.shape[0]
+        if self.face_tracker is None:
+            return self._backend_faces(gray)
+        return self.face_tracker.find_faces(gray, self._backend_faces)
+
+    def min_face_size(self, frame_height):
+        """
+        Smallest face side (full-resolution pixels) worth searching for.
+        Allows faces down to half the expected size.
+        """
+        if self.expected_face_frac is None:
+            return 30
+        return max(30, int(frame_height * self.expected_face_frac * 0.5))
+
+    def _backend_faces(self, gray):
+        min_side = self.min_face_size(self._frame_height or gray.shape[0])
+        return self.face_backend.detect_faces(gray, min_side)
+
+    def detect_eyes(self, gray, faces, out_frame=None):
+        """
+        True if open eyes are found in any of the faces (stops at the first one),
+        searching the upper half of each face box. Draws the face boxes on out_frame when given.
+        In run mode the patient's eye classifier decides instead of the eye cascade, if there is one.
+        """
+        self.last_face = None
+        self.last_eye_count = 0
+        backend = self.eye_backend
+        if self.mode == "run" and self.classifier_backend is not None:
+            backend = self.classifier_backend
+        for (x, y, w, h) in faces:
+            self.last_face = (x, y, w, h)
+            if out_frame is not None:
+                cv2.rectangle(out_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            t0 = self.timer.start()
+            is_open, eye_count = backend.eyes_open(gray, eye_region((x, y, w, h)))
+            self.timer.stop("eye_detect", t0)
+            if is_open:
+                self.last_eye_count = eye_count
+                return True
+        return False
+
+    def benchmark_frame(self, frame):
+        """
+        Run both cascades on a frame without touching any setup/run state.
+        Used to measure detection throughput (see rate_governor.py).
+        """
+        with self.lock:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            faces = self.detect_faces(gray)
+            self.detect_eyes(gray, faces)
 
     def process_frame(self, frame):
         """
-        Called each frame from the GUI to do detection.
+        Called for each frame by the detection worker (see pipeline.py).
 
         Returns: (status, old_mode, out_frame)
           - status = None => still running
@@ -80,106 +414,190 @@ class EyeDetector:
           - status = 2 => "awake threshold" event => play the song (run mode)
 
           old_mode => "setup_open", "setup_closed", or "run"
-          out_frame => frame with green bounding box if face detected
+          out_frame => the same frame (not a copy), with green bounding boxes drawn
+                       on it if draw_boxes is set; the boxes are also in last_faces
         """
-        out_frame = frame.copy()
+        with self.lock:
+            return self._process_frame_locked(frame)
+
+    def _process_frame_locked(self, frame):
+        out_frame = frame
         if not self.active:
             # Not in detection mode
             return (None, None, out_frame)
 
         # Convert to grayscale
+        t_start = time.perf_counter()
         gray = cv2.cvtColor(out_frame, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(30, 30)
-        )
+        t_gray = time.perf_counter()
+
+        if self.mode in self.calibration_frames:
+            self._keep_calibration_frame(gray)
 
+        gate = self.motion_gate
+        # Setups detect on every frame: each one is a sample (and a crop for the eye classifier)
+        if gate is not None and self.mode == "run" and not gate.needs_detection(gray, self.clock()):
+            # Static scene => same result as the last detected frame
+            faces = self.last_faces
+            no_face = self.last_state in ("no_face", "face_rejected")
+            eyes_open = self.last_state == "open"
+            if self.draw_boxes:
+                for (x, y, w, h) in faces:
+                    cv2.rectangle(out_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            t_faces = t_eyes = time.perf_counter()
+            self.timer.add("motion_skip", (t_faces - t_gray) * 1000.0)
+            return self._finish_frame(out_frame, no_face, eyes_open, t_start, t_gray, t_faces, t_eyes)
+
+        faces = self.detect_faces(gray)
+        self.last_faces = faces
+        if self.patient is not None:
+            if self.mode in self.calibration_frames:
+                self.patient.observe(self.mode, gray, faces)
+            # Only the patient's face goes to the eye stage (all faces until learned)
+            faces = self.patient.select(gray, faces)
+        if self.eye_classifier and self.mode in self.eye_crops and len(faces) == 1:
+            self._keep_eye_crop(gray, faces[0])
+        t_faces = time.perf_counter()
+
+        no_face = len(faces) == 0
         eyes_open = False
-        no_face = False
 
-        if len(faces) == 0:
-            print("[EyeDetector] No face detected")
-            no_face = True
+        if no_face:
+            self.last_state = "face_rejected" if self.last_faces else "no_face"
+            self.last_face = None
+            self.last_eye_count = 0
         else:
-            for (x, y, w, h) in faces:
-                cv2.rectangle(out_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                face_roi = gray[y:y+h, x:x+w]
-                eyes = self.eye_cascade.detectMultiScale(
-                    face_roi,
-                    scaleFactor=1.1,
-                    minNeighbors=5,
-                    minSize=(30, 30)
-                )
-                if len(eyes) > 0:
-                    print("[EyeDetector] Eyes are OPEN")
-                    eyes_open = True
-                    break
-                else:
-                    print("[EyeDetector] Eyes are CLOSED")
+            eyes_open = self.detect_eyes(gray, faces, out_frame if self.draw_boxes else None)
+            if eyes_open:
+                self.last_state = "open"
+            else:
+                self.last_state = "closed"
+        t_eyes = time.perf_counter()
+        if gate is not None and self.mode == "run":
+            # Only where the gate was asked (run mode): this frame becomes its reference
+            gate.detected(self.clock())
+        return self._finish_frame(out_frame, no_face, eyes_open, t_start, t_gray, t_faces, t_eyes)
+
+    def _finish_frame(self, out_frame, no_face, eyes_open, t_start, t_gray, t_faces, t_eyes):
+        # Logged only when the state changes, with how long the previous one lasted
+        self.log.state("EyeDetector", "eyes", self.last_state)
+        if self.last_state != self._notified_state:
+            self._notified_state = self.last_state
+            self._notify("state", state=self.last_state)
+
+        status, old_mode = self._update_state(no_face, eyes_open, rejected=self.last_state == "face_rejected")
+        t_end = time.perf_counter()
 
+        timer = self.timer
+        if timer.enabled:
+            timer.add("cvtColor", (t_gray - t_start) * 1000.0)
+            timer.add("face_detect", (t_faces - t_gray) * 1000.0)
+            timer.add("process_frame", (t_end - t_start) * 1000.0)
+
+        recorder = self.session_recorder
+        if recorder is not None:
+            recorder.append(
+                self.clock(), self.last_face, self.last_eye_count, STATE_CODES[self.last_state],
+                (t_gray - t_start) * 1000.0, (t_faces - t_gray) * 1000.0,
+                (t_eyes - t_faces) * 1000.0, (t_end - t_start) * 1000.0
+            )
+
+        return (status, old_mode, out_frame)
+
+    def _finish_setup(self, success, ratio, elapsed, early):
+        old_mode = self.mode
+        self.stop_detection()
+        self.calibration_results[old_mode] = success
+        self._notify("setup", mode=old_mode, success=success, ratio=round(ratio, 2),
+                     seconds=round(elapsed, 1))
+        if success and self.patient is not None:
+            self.patient.learn()
+        results = self.calibration_results
+        if success and self.eye_classifier and results.get("setup_open") and results.get("setup_closed"):
+            self.train_eye_classifier()
+        how = "early" if early else "after 15s"
+        if success:
+            self.log.info("EyeDetector", f"{old_mode} SUCCESS ({how})", ratio=round(ratio, 2),
+                          seconds=round(elapsed, 1))
+            return (1, old_mode)
+        self.log.warning("EyeDetector", f"{old_mode} FAIL ({how})", ratio=round(ratio, 2),
+                         seconds=round(elapsed, 1))
+        return (0, old_mode)
+
+    def _notify(self, kind, **info):
+        listener = self.event_listener
+        if listener is not None:
+            listener(kind, info)
+
+    def apply_result(self, no_face, eyes_open, rejected=False):
+        """
+        Feed an already-computed detection result into the setup/run logic.
+        Same return codes as process_frame, without the frame: (status, old_mode).
+        Used by batch_analyze.py to replay decisions from stored per-frame results.
+        """
+        with self.lock:
+            if not self.active:
+                return (None, None)
+            return self._update_state(no_face, eyes_open, rejected)
+
+    def _update_state(self, no_face, eyes_open, rejected=False):
         # -------- Setup Modes -----------
         if self.mode in ("setup_open", "setup_closed"):
             self.frame_count += 1
             if self.mode == "setup_open":
                 # Count eyes_open
-                if eyes_open:
-                    self.hit_count += 1
-            elif self.mode == "setup_closed":
+                hit = eyes_open
+            else:
                 # Count closed only if a face is found but no eyes
-                if len(faces) > 0 and not eyes_open:
-                    self.hit_count += 1
+                hit = not no_face and not eyes_open
+            if hit:
+                self.hit_count += 1
+
+            now = self.clock()
+            elapsed = now - self.start_time
+            ratio = self.hit_count / float(self.frame_count) if self.frame_count else 0
 
-            elapsed = time.time() - self.start_time
+            test = self.setup_test
+            decision = None
+            if test is not None:
+                decision = test.update(hit, now)
+                if elapsed < self.min_setup_seconds:
+                    decision = None
+                elif decision and self.eye_classifier and len(self.eye_crops[self.mode]) < self.min_eye_crops:
+                    # Keep going until there are enough crops to train the eye classifier on
+                    decision = None
+            self.setup_progress = {
+                "mode": self.mode,
+                "elapsed": round(elapsed, 1),
+                "ratio": round(ratio, 2),
+                "confidence": round(test.confidence(), 3) if test is not None else None,
+            }
+
+            if decision is not None:
+                return self._finish_setup(decision, ratio, elapsed, early=True)
             if elapsed > 15:
                 # Check ratio > 0.8 for success
-                ratio = self.hit_count / float(self.frame_count) if self.frame_count else 0
-                old_mode = self.mode
-                self.stop_detection()
-                if ratio > 0.8:
-                    print(f"[EyeDetector] {old_mode} SUCCESS => ratio={ratio:.2f}")
-                    return (1, old_mode, out_frame)
-                else:
-                    print(f"[EyeDetector] {old_mode} FAIL => ratio={ratio:.2f}")
-                    return (0, old_mode, out_frame)
+                return self._finish_setup(ratio > 0.8, ratio, elapsed, early=False)
 
-            return (None, None, out_frame)
+            return (None, None)
 
-        # -------- Run Mode (15-second blocks) -----------
+        # -------- Run Mode -----------
         if self.mode == "run":
-            self.block_frame_count += 1
+            if rejected:
+                # Only someone else's face in view: tells nothing about the patient,
+                # so it counts neither as awake nor as asleep
+                return (None, None)
             # "hit" if eyes_open OR no_face
-            if eyes_open or no_face:
-                self.block_hit_count += 1
-
-            block_elapsed = time.time() - self.block_start_time
-            if block_elapsed > 15:
-                # Evaluate success if ratio > 0.65
-                ratio = 0.0
-                if self.block_frame_count > 0:
-                    ratio = self.block_hit_count / float(self.block_frame_count)
+            fired, block_info = self.alert_policy.update(self.clock(), eyes_open or no_face)
+            if block_info is not None:
+                self.log.info("EyeDetector", "run block" if not fired else "run alert", **block_info)
+                self._notify("alert" if fired else "block", **block_info)
 
-                success_val = 1 if (ratio > 0.65) else 0
+            # Threshold reached => return code=2 => play the song
+            if fired:
+                return (2, "run")
 
-                idx = self.block_index % 20
-                self.run_results[idx] = success_val
-                self.block_index += 1
-
-                # Reset for next block
-                self.block_hit_count = 0
-                self.block_frame_count = 0
-                self.block_start_time = time.time()
-
-                total_success = sum(self.run_results)
-                threshold_blocks = self.awake_time / 15.0
-                print(f"[EyeDetector] run block => block_ratio={ratio:.2f}, success={success_val}, sum={total_success}")
-
-                # If total_success >= threshold_blocks => return code=2 => play the song
-                if total_success >= threshold_blocks:
-                    return (2, "run", out_frame)
-
-            return (None, None, out_frame)
+            return (None, None)
 
         # default
-        return (None, None, out_frame)
+        return (None, None)
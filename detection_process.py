@@ -0,0 +1,349 @@
+# detection_process.py
+"""
+EyeDetector in its own process, fed through a shared-memory FrameBus.
+
+    capture thread (GUI / headless process) -> FrameBus -> detection process
+    detection process -> small result tuples over a multiprocessing queue -> ProcessPipeline
+
+The cascades get a core and a GIL to themselves; the GUI process only captures
+(OpenCV releases the GIL while reading the camera) and draws. Frames are never
+pickled: the detection process and the preview read the same slots in place.
+
+The process is spawned, not forked: the parent already runs Tk, audio and
+logging threads whose locks a fork would copy mid-use. It stops with the
+parent - stop(), an atexit hook for exits that skip it, and the child's own
+check that its parent is still alive.
+
+ProcessPipeline has the FramePipeline interface (start, stop,
+set_detection_active, latest_result, pending_events, stats), and its
+'detector' is a RemoteDetector with the EyeDetector calls the apps use.
+Result frames are views into the bus: use them right away (they stay valid
+for about 'slots' camera frames).
+"""
+
+import atexit
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+import time
+
+from frame_bus import BusWriter, FrameBus
+from pipeline import CaptureThread, LatestQueue, PipelineStats, ResultPacket
+
+# EyeDetector methods the parent may call in the detection process
+REMOTE_CALLS = (
+    "start_detection", "stop_detection", "set_alert_policy", "apply_tuning",
+    "record_session", "attach_recorder", "get_checkpoint", "resume_from",
+)
+
+
+def detection_main(bus_spec, commands, results, stop_event, detector_kwargs):
+    """
+    Detection process entry point.
+    """
+    import auto_tune
+    from cv_close_eye_detect import EyeDetector
+    from event_log import EventLog
+
+    log = EventLog(path="eye_events_detection.log")
+    parent = mp.parent_process()
+    bus = FrameBus.attach(bus_spec)
+    detector = EyeDetector(event_log=log, **detector_kwargs)
+    detector.event_listener = lambda kind, info: results.put(("event", kind, info))
+
+    def tune(call_id):
+        try:
+            params = auto_tune.tune(detector)
+        except Exception as e:
+            params = {"ok": False, "reason": str(e)}
+        results.put(("reply", call_id, params))
+
+    active = False
+    seq = 0
+    torn = 0
+    try:
+        while not stop_event.is_set():
+            if parent is not None and not parent.is_alive():
+                log.warning("detection_process", "parent process gone, stopping")
+                break
+            while True:
+                try:
+                    call_id, name, args = commands.get(block=not active, timeout=0.05)
+                except queue.Empty:
+                    break
+                if name == "set_active":
+                    active = args[0]
+                elif name == "tune":
+                    # Runs its own process pool; keep detecting meanwhile
+                    threading.Thread(target=tune, args=(call_id,), daemon=True).start()
+                elif name in REMOTE_CALLS:
+                    if name == "attach_recorder":
+                        # Only detaching can be asked for remotely (see RemoteDetector)
+                        value = getattr(detector, name)(None)
+                        if value is not None:
+                            value.close()
+                        value = None
+                    elif name == "resume_from":
+                        # The parent mirrors the restored setup results too
+                        resumed = detector.resume_from(*args)
+                        value = (resumed, dict(detector.calibration_results))
+                    else:
+                        value = getattr(detector, name)(*args)
+                    if call_id is not None:
+                        results.put(("reply", call_id, value))
+            if not active:
+                continue
+
+            frame = bus.wait_newer(seq, timeout=0.05)
+            if frame is None:
+                continue
+            seq, capture_time, view = frame
+            status, old_mode, _ = detector.process_frame(view)
+            if not bus.is_current(seq):
+                torn += 1
+                log.warning("detection_process", "frame replaced while being processed", torn=torn)
+            results.put((
+                "result", seq, capture_time, time.monotonic(), status, old_mode,
+                [tuple(int(v) for v in f) for f in detector.last_faces],
+                detector.last_state, detector.mode, detector.alert_policy.window_summary(),
+                detector.setup_progress
+            ))
+    finally:
+        detector.stop_detection()
+        old = detector.attach_recorder(None)
+        if old is not None:
+            old.close()
+        bus.close()
+        log.close()
+
+
+class _RemoteAlertPolicy:
+    """
+    Just enough of an alert policy for status displays.
+    """
+
+    def __init__(self):
+        self.summary = ""
+
+    def window_summary(self):
+        return self.summary
+
+
+class RemoteDetector:
+    """
+    Parent-side stand-in for the EyeDetector in the detection process.
+
+    Calls are sent over a queue; get_checkpoint(), resume_from() and tune()
+    wait for the answer. last_state, last_faces, mode, calibration_results,
+    setup_progress and alert_policy.window_summary() mirror the latest results. event_listener is
+    called (on the receiver thread) for every event the detector reports.
+    """
+
+    def __init__(self, commands):
+        self._commands = commands
+        self._ids = itertools.count(1)
+        self._replies = {}
+        self._reply_lock = threading.Lock()
+
+        self.mode = None
+        self.last_state = None
+        self.last_faces = []
+        self.calibration_results = {}
+        self.setup_progress = None
+        self.alert_policy = _RemoteAlertPolicy()
+        self.event_listener = None
+
+    def _send(self, name, *args):
+        self._commands.put((None, name, args))
+
+    def _call(self, name, *args, timeout=5.0):
+        call_id = next(self._ids)
+        waiter = [threading.Event(), None]
+        with self._reply_lock:
+            self._replies[call_id] = waiter
+        self._commands.put((call_id, name, args))
+        if not waiter[0].wait(timeout):
+            with self._reply_lock:
+                self._replies.pop(call_id, None)
+            raise TimeoutError(f"detection process did not answer {name}()")
+        return waiter[1]
+
+    # ----------------- EyeDetector calls -----------------
+    def start_detection(self, mode, awake_time=30):
+        self.mode = mode
+        self._send("start_detection", mode, awake_time)
+
+    def stop_detection(self):
+        self.mode = None
+        self._send("stop_detection")
+
+    def set_alert_policy(self, policy):
+        self._send("set_alert_policy", policy)
+
+    def apply_tuning(self, params):
+        self._send("apply_tuning", params)
+
+    def record_session(self, path):
+        self._send("record_session", path)
+
+    def attach_recorder(self, recorder):
+        """
+        Only None (stop recording) is supported; the file is closed in the
+        detection process. Use record_session(path) to start one.
+        """
+        if recorder is not None:
+            raise ValueError("use record_session(path) with a detection process")
+        self._send("attach_recorder", None)
+        return None
+
+    def get_checkpoint(self):
+        return self._call("get_checkpoint")
+
+    def resume_from(self, checkpoint):
+        # Generous timeout: right after start the process may still be importing OpenCV
+        resumed, calibration_results = self._call("resume_from", checkpoint, timeout=30.0)
+        self.calibration_results = calibration_results
+        if resumed:
+            self.mode = "run"
+        return resumed
+
+    def tune(self, timeout=600.0):
+        """
+        Run auto_tune.tune() on the calibration frames kept in the detection process.
+        """
+        return self._call("tune", timeout=timeout)
+
+    # ----------------- Receiver thread -----------------
+    def _on_reply(self, call_id, value):
+        with self._reply_lock:
+            waiter = self._replies.pop(call_id, None)
+        if waiter is not None:
+            waiter[1] = value
+            waiter[0].set()
+
+    def _on_event(self, kind, info):
+        if kind == "setup":
+            self.calibration_results[info["mode"]] = info["success"]
+            self.mode = None
+        listener = self.event_listener
+        if listener is not None:
+            listener(kind, info)
+
+
+class ProcessPipeline:
+    """
+    capture thread -> FrameBus -> detection process -> result queue -> GUI
+    """
+
+    def __init__(self, cap, detector_kwargs=None, flip=True, slots=8):
+        import cv2
+
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or 640
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or 480
+        self.bus = FrameBus(width, height, slots=slots)
+        self.stats = PipelineStats()
+        self.capture_thread = CaptureThread(cap, BusWriter(self.bus), self.stats, flip=flip)
+
+        context = mp.get_context("spawn")
+        self.commands = context.Queue()
+        self.result_queue = context.Queue()
+        self.stop_event = context.Event()
+        self.detector = RemoteDetector(self.commands)
+        # Not a daemon (auto-tuning starts a process pool from it), so stop() must
+        # always run: start() registers it with atexit as well
+        self.process = context.Process(
+            target=detection_main,
+            args=(self.bus.spec(), self.commands, self.result_queue, self.stop_event, detector_kwargs or {}),
+            name="detection"
+        )
+
+        self.results = LatestQueue()
+        self.events = queue.Queue()
+        self.detection_active = False
+        self._last_shown = 0
+        self._running = False
+        self._stopped = False
+        self._receiver = threading.Thread(target=self._receive, name="detection-results", daemon=True)
+
+    def start(self):
+        self._running = True
+        self.process.start()
+        atexit.register(self.stop)
+        self.capture_thread.start()
+        self._receiver.start()
+
+    def stop(self, timeout=3.0):
+        if self._stopped:
+            return
+        self._stopped = True
+        atexit.unregister(self.stop)
+        self.capture_thread.running = False
+        if self.capture_thread.is_alive():
+            self.capture_thread.join(1.0)
+        self.stop_event.set()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self._running = False
+        if self._receiver.is_alive():
+            self._receiver.join(1.0)
+        self.bus.close()
+
+    def set_detection_active(self, active):
+        self.detection_active = active
+        self.detector._send("set_active", active)
+
+    def _receive(self):
+        detector = self.detector
+        while self._running:
+            try:
+                message = self.result_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            kind = message[0]
+            if kind == "result":
+                _, seq, capture_time, done_time, status, old_mode, faces, state, mode, window, progress = message
+                detector.last_state = state
+                detector.last_faces = faces
+                detector.alert_policy.summary = window
+                detector.mode = mode
+                detector.setup_progress = progress
+                frame = self.bus.read(seq)
+                packet = ResultPacket(seq, capture_time, done_time, status, old_mode,
+                                      frame[1] if frame is not None else None, faces)
+                self.stats.detection.tick()
+                if status is not None:
+                    self.events.put(packet)
+                if packet.frame is not None:
+                    self.results.put(packet)
+            elif kind == "event":
+                detector._on_event(message[1], message[2])
+            elif kind == "reply":
+                detector._on_reply(message[1], message[2])
+
+    def latest_result(self):
+        """
+        Newest detection result not yet shown; while detection is off, the newest
+        camera frame (faces None). None if there is nothing new.
+        """
+        result = self.results.get_nowait()
+        if result is None and not self.detection_active:
+            seq = self.bus.latest_seq()
+            frame = self.bus.read(seq) if seq > self._last_shown else None
+            if frame is not None:
+                result = ResultPacket(seq, frame[0], time.monotonic(), None, None, frame[1], None)
+        if result is None or result.seq <= self._last_shown:
+            return None
+        self._last_shown = result.seq
+        self.stats.record_latency(result.capture_time)
+        self.stats.display.tick()
+        return result
+
+    def pending_events(self):
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
@@ -0,0 +1,271 @@
+# detector_backends.py
+"""
+Swappable face and eye-state detectors for EyeDetector.
+
+Face backends: detect_faces(gray, min_side) -> [(x, y, w, h), ...]
+    "haar" - haarcascade_frontalface_alt.xml (the original detector)
+    "lbp"  - lbpcascade_frontalface_improved.xml (much faster, a bit less accurate)
+    "dnn"  - OpenCV DNN res10 SSD face detector on CPU
+             (deploy.prototxt + res10_300x300_ssd_iter_140000.caffemodel)
+
+Eye backends: eyes_open(gray, region) -> (is_open, eye_count)
+    "eye_tree" - haarcascade_eye_tree_eyeglasses.xml (the original detector)
+    "eye"      - haarcascade_eye.xml (cheaper, no eyeglasses tree)
+
+Model files are looked up next to this file, then in OpenCV's own data folder.
+Every backend counts its calls, hits and time, and reports them with stats(),
+so replay.py can compare speed and hit rates of backends on the same footage.
+"""
+
+import inspect
+import os
+import threading
+import time
+
+import cv2
+
+# Model files live next to this file, whatever the working directory is
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Training windows of the face cascades - nothing smaller can be found
+CASCADE_WINDOW = 20         # haarcascade_frontalface_alt.xml
+LBP_CASCADE_WINDOW = 24     # lbpcascade_frontalface_improved.xml
+
+# Parsed cascades, shared by every EyeDetector in the process
+_cascade_cache = {}
+_cascade_lock = threading.Lock()
+
+
+def find_model_file(path):
+    """
+    Resolve a model file: absolute paths as is, otherwise next to this file,
+    then in OpenCV's bundled cascade folder.
+    """
+    if os.path.isabs(path):
+        return path
+    local = os.path.normpath(os.path.join(BASE_DIR, path))
+    if os.path.exists(local):
+        return local
+    data_dir = getattr(getattr(cv2, "data", None), "haarcascades", None)
+    if data_dir:
+        bundled = os.path.join(data_dir, os.path.basename(path))
+        if os.path.exists(bundled):
+            return bundled
+    return local
+
+
+def load_cascade(path):
+    """
+    Parse a Haar/LBP cascade XML once per process and reuse it afterwards.
+    """
+    path = find_model_file(path)
+    with _cascade_lock:
+        cascade = _cascade_cache.get(path)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(path)
+            if cascade.empty():
+                raise IOError(f"Cannot load cascade: {path}")
+            _cascade_cache[path] = cascade
+        return cascade
+
+
+class BackendStats:
+    """
+    Throughput and hit counting shared by all backends.
+    """
+
+    name = "backend"
+
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.total_time = 0.0
+
+    def _count(self, t0, hit):
+        self.calls += 1
+        self.total_time += time.perf_counter() - t0
+        if hit:
+            self.hits += 1
+
+    def stats(self):
+        avg = self.total_time / self.calls if self.calls else 0.0
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "hit_rate": round(self.hits / self.calls, 4) if self.calls else None,
+            "avg_ms": round(avg * 1000.0, 3),
+            "fps": round(1.0 / avg, 1) if avg else None,
+        }
+
+    def reset_stats(self):
+        self.calls = 0
+        self.hits = 0
+        self.total_time = 0.0
+
+
+# ----------------- Face backends -----------------
+class CascadeFaceBackend(BackendStats):
+    name = "haar"
+    default_path = "haarcascade_frontalface_alt.xml"
+    window = CASCADE_WINDOW
+
+    def __init__(self, path=None, detection_scale=0.5, scale_factor=1.1, min_neighbors=5):
+        """
+        detection_scale => search on the grayscale image resized by this factor,
+            boxes are mapped back to full resolution (1.0 => native resolution)
+        """
+        super().__init__()
+        self.path = path or self.default_path
+        self.cascade = load_cascade(self.path)
+        self.detection_scale = detection_scale
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def detect_faces(self, gray, min_side):
+        t0 = time.perf_counter()
+        scale = self.detection_scale
+        if scale >= 1.0:
+            faces = [tuple(f) for f in self.cascade.detectMultiScale(
+                gray,
+                scaleFactor=self.scale_factor,
+                minNeighbors=self.min_neighbors,
+                minSize=(min_side, min_side)
+            )]
+        else:
+            # Find the face on a downscaled image, then map the boxes back
+            small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            small_side = max(self.window, int(min_side * scale))
+            faces = [
+                (int(x / scale), int(y / scale), int(w / scale), int(h / scale))
+                for (x, y, w, h) in self.cascade.detectMultiScale(
+                    small,
+                    scaleFactor=self.scale_factor,
+                    minNeighbors=self.min_neighbors,
+                    minSize=(small_side, small_side)
+                )
+            ]
+        self._count(t0, len(faces) > 0)
+        return faces
+
+
+class LbpFaceBackend(CascadeFaceBackend):
+    name = "lbp"
+    default_path = "lbpcascade_frontalface_improved.xml"
+    window = LBP_CASCADE_WINDOW
+
+
+class DnnFaceBackend(BackendStats):
+    name = "dnn"
+
+    def __init__(self, config="deploy.prototxt", model="res10_300x300_ssd_iter_140000.caffemodel",
+                 input_size=(300, 300), confidence=0.6):
+        super().__init__()
+        self.net = cv2.dnn.readNetFromCaffe(find_model_file(config), find_model_file(model))
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.input_size = input_size
+        self.confidence = confidence
+
+    def detect_faces(self, gray, min_side):
+        t0 = time.perf_counter()
+        height, width = gray.shape[:2]
+        # The SSD was trained on color images - feed the gray channel three times
+        bgr = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        blob = cv2.dnn.blobFromImage(
+            cv2.resize(bgr, self.input_size), 1.0, self.input_size, (104.0, 177.0, 123.0)
+        )
+        self.net.setInput(blob)
+        detections = self.net.forward()
+
+        faces = []
+        for i in range(detections.shape[2]):
+            if detections[0, 0, i, 2] < self.confidence:
+                continue
+            x0 = max(0, int(detections[0, 0, i, 3] * width))
+            y0 = max(0, int(detections[0, 0, i, 4] * height))
+            x1 = min(width, int(detections[0, 0, i, 5] * width))
+            y1 = min(height, int(detections[0, 0, i, 6] * height))
+            w, h = x1 - x0, y1 - y0
+            if w >= min_side and h >= min_side:
+                faces.append((x0, y0, w, h))
+        self._count(t0, len(faces) > 0)
+        return faces
+
+
+# ----------------- Eye-state backends -----------------
+def eye_region(face):
+    """
+    Part of a face box (x, y, w, h) the eyes are searched in: its upper half.
+    Half the pixels, and no nostrils or mouth corners mistaken for eyes.
+    """
+    x, y, w, h = face
+    return (x, y, w, h - h // 2)
+
+
+class CascadeEyeBackend(BackendStats):
+    name = "eye_tree"
+    default_path = "haarcascade_eye_tree_eyeglasses.xml"
+
+    def __init__(self, path=None, scale_factor=1.1, min_neighbors=5, min_size=30):
+        super().__init__()
+        self.path = path or self.default_path
+        self.cascade = load_cascade(self.path)
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def eyes_open(self, gray, face):
+        """
+        (True, eye_count) if open eyes are found inside 'face' (x, y, w, h),
+        normally eye_region() of the face box.
+        """
+        t0 = time.perf_counter()
+        x, y, w, h = face
+        eyes = self.cascade.detectMultiScale(
+            gray[y:y+h, x:x+w],
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=(self.min_size, self.min_size)
+        )
+        found = len(eyes) > 0
+        self._count(t0, found)
+        return (found, len(eyes))
+
+
+class PlainEyeBackend(CascadeEyeBackend):
+    name = "eye"
+    default_path = "haarcascade_eye.xml"
+
+
+FACE_BACKENDS = {
+    "haar": CascadeFaceBackend,
+    "lbp": LbpFaceBackend,
+    "dnn": DnnFaceBackend,
+}
+
+EYE_BACKENDS = {
+    "eye_tree": CascadeEyeBackend,
+    "eye": PlainEyeBackend,
+}
+
+
+def make_face_backend(backend, **kwargs):
+    """
+    'backend' is a name from FACE_BACKENDS or an already-built backend object.
+    Keyword arguments the backend doesn't take (e.g. detection_scale for "dnn") are dropped.
+    """
+    return _make(backend, FACE_BACKENDS, "face", kwargs)
+
+
+def make_eye_backend(backend, **kwargs):
+    return _make(backend, EYE_BACKENDS, "eye", kwargs)
+
+
+def _make(backend, registry, kind, kwargs):
+    if not isinstance(backend, str):
+        return backend
+    if backend not in registry:
+        raise ValueError(f"Unknown {kind} backend '{backend}' (choose from {', '.join(registry)})")
+    cls = registry[backend]
+    accepted = inspect.signature(cls.__init__).parameters
+    return cls(**{k: v for k, v in kwargs.items() if k in accepted})
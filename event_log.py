@@ -0,0 +1,174 @@
+# event_log.py
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
+class EventLog:
+    """
+    Structured event log that is cheap to call from the detection path.
+
+    log() only appends a tuple to an in-memory deque; a background writer
+    thread formats the pending records every 'flush_interval' seconds and
+    writes them in one batch to a size-rotated file (path, path.1 .. path.N).
+    Records at 'echo_level' or above are also printed to stdout by the writer.
+
+    state() aggregates per-frame states: a record is only produced when the
+    value changes, saying how many frames / seconds the previous value lasted.
+    """
+
+    def __init__(self, path="eye_events.log", level=INFO, echo_level=INFO,
+                 max_bytes=5 * 1024 * 1024, backup_count=5, flush_interval=1.0):
+        self.path = path
+        self.level = level
+        self.echo_level = echo_level
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+
+        # deque.append / popleft are thread-safe without a lock
+        self._pending = deque()
+        self._states = {}   # key -> [value, frame_count, since]
+
+        self._file = None
+        self._writer = None
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    # ----------------- Hot path -----------------
+    def log(self, level, source, message, **fields):
+        if level < self.level:
+            return
+        if self._writer is None:
+            self._start_writer()
+        self._pending.append((time.time(), level, source, message, fields))
+
+    def debug(self, source, message, **fields):
+        self.log(DEBUG, source, message, **fields)
+
+    def info(self, source, message, **fields):
+        self.log(INFO, source, message, **fields)
+
+    def warning(self, source, message, **fields):
+        self.log(WARNING, source, message, **fields)
+
+    def error(self, source, message, **fields):
+        self.log(ERROR, source, message, **fields)
+
+    def state(self, source, key, value, level=INFO):
+        """
+        Record 'value' for 'key' on every frame; logs only on changes.
+        """
+        current = self._states.get(key)
+        if current is not None and current[0] == value:
+            current[1] += 1
+            return
+        now = time.time()
+        if current is None:
+            self.log(level, source, f"{key}={value}")
+        else:
+            self.log(level, source, f"{key}={value}", previous=current[0],
+                     previous_frames=current[1], previous_s=round(now - current[2], 2))
+        self._states[key] = [value, 1, now]
+
+    def reset_state(self, key):
+        self._states.pop(key, None)
+
+    # ----------------- Writer thread -----------------
+    def _start_writer(self):
+        with self._start_lock:
+            if self._writer is not None:
+                return
+            self._writer = threading.Thread(target=self._writer_loop, name="event-log", daemon=True)
+            self._writer.start()
+
+    def _writer_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """
+        Write every pending record in one batch. Called by the writer thread.
+        """
+        if not self._pending:
+            return
+        lines = []
+        echo = []
+        while True:
+            try:
+                record = self._pending.popleft()
+            except IndexError:
+                break
+            line = self._format(record)
+            lines.append(line)
+            if record[1] >= self.echo_level:
+                echo.append(line)
+
+        try:
+            self._write("".join(lines))
+        except OSError as e:
+            print(f"[EventLog] Could not write {self.path}: {e}")
+        if echo:
+            sys.stdout.write("".join(echo))
+            sys.stdout.flush()
+
+    @staticmethod
+    def _format(record):
+        ts, level, source, message, fields = record
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)) + f".{int(ts % 1 * 1000):03d}"
+        extra = "".join(f" {k}={v}" for k, v in fields.items())
+        return f"{stamp} {LEVEL_NAMES.get(level, level)} [{source}] {message}{extra}\n"
+
+    def _write(self, text):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(text)
+        self._file.flush()
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def close(self):
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join(2.0)
+        else:
+            self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_default_log = None
+
+
+def get_event_log():
+    """
+    Process-wide EventLog, created on first use.
+    """
+    global _default_log
+    if _default_log is None:
+        _default_log = EventLog()
+    return _default_log
@@ -0,0 +1,208 @@
+# eye_classifier.py
+"""
+A tiny per-patient eye-state classifier, trained on the setup frames.
+
+setup_open and setup_closed keep crops of the patient's eye region (the upper
+half of the face box, see detector_backends.eye_region). Once both setups
+have succeeded, a logistic regression is fitted on
+
+    gradient-orientation histograms (HOG, 9 bins in 4x2 cells)
+    + a 16x8 brightness-normalized thumbnail
+
+of each crop, computed with a handful of vectorized numpy operations on a
+32x16 resize. In run mode it replaces the eye cascade: one resize and a dot
+product instead of a multi-scale cascade search, and it learns this
+patient's closed eyes in this room's light rather than relying on an eye
+being found at all.
+
+Every model is checked on held-out setup crops against the cascade (accuracy
+and ms per crop); it is only used if it does at least as well as the cascade
+and reaches 'min_accuracy'. When the patient is named (EyeDetector patient_id),
+the model is cached in 'model_dir' under that name, so a restart (or the next
+night) starts with it.
+"""
+
+import json
+import os
+import re
+import time
+
+import cv2
+import numpy as np
+
+from detector_backends import BackendStats
+
+# Size every eye-region crop is resized to (width, height)
+CROP_SIZE = (32, 16)
+HOG_CELL = 8
+HOG_BINS = 9
+
+
+def eye_features(crop):
+    """
+    Feature vector (float32) of a grayscale eye-region crop.
+    """
+    small = cv2.resize(crop, CROP_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    # HOG: unsigned gradient orientation, magnitude-weighted, per 8x8 cell
+    gx = np.zeros_like(small)
+    gy = np.zeros_like(small)
+    gx[:, 1:-1] = small[:, 2:] - small[:, :-2]
+    gy[1:-1, :] = small[2:, :] - small[:-2, :]
+    magnitude = np.hypot(gx, gy)
+    orientation = np.arctan2(gy, gx) % np.pi
+    bins = np.minimum((orientation * (HOG_BINS / np.pi)).astype(np.int32), HOG_BINS - 1)
+    height, width = small.shape
+    rows = np.arange(height)[:, None] // HOG_CELL
+    cols = np.arange(width)[None, :] // HOG_CELL
+    cells = (height // HOG_CELL) * (width // HOG_CELL)
+    index = (rows * (width // HOG_CELL) + cols) * HOG_BINS + bins
+    hog = np.bincount(index.ravel(), weights=magnitude.ravel(), minlength=cells * HOG_BINS)
+    hog /= np.linalg.norm(hog) + 1e-6
+
+    # Thumbnail, zero mean and unit variance (lighting-independent)
+    thumb = cv2.resize(small, (CROP_SIZE[0] // 2, CROP_SIZE[1] // 2), interpolation=cv2.INTER_AREA).ravel()
+    thumb = (thumb - thumb.mean()) / (thumb.std() + 1e-6)
+
+    return np.concatenate([hog.astype(np.float32), thumb.astype(np.float32)])
+
+
+class EyeStateClassifier:
+    """
+    L2-regularized logistic regression, P(open) = sigmoid(w . standardized(x) + b).
+    """
+
+    def __init__(self, weights=None, bias=0.0, mean=None, std=None, info=None):
+        self.weights = weights
+        self.bias = bias
+        self.mean = mean
+        self.std = std
+        self.info = info or {}      # training and benchmark figures, saved with the model
+
+    def fit(self, X, y, l2=0.01, learning_rate=0.5, iterations=300):
+        """
+        X => (n, features) float array, y => 1 for open, 0 for closed.
+        Full-batch gradient descent; both classes weigh the same whatever their counts.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        self.mean = X.mean(axis=0)
+        self.std = X.std(axis=0) + 1e-6
+        Z = (X - self.mean) / self.std
+
+        positives = max(1.0, y.sum())
+        negatives = max(1.0, len(y) - y.sum())
+        sample_weight = np.where(y > 0, 0.5 / positives, 0.5 / negatives)
+
+        w = np.zeros(Z.shape[1])
+        b = 0.0
+        for _ in range(iterations):
+            p = 1.0 / (1.0 + np.exp(-(Z @ w + b)))
+            error = (p - y) * sample_weight
+            w -= learning_rate * (Z.T @ error + l2 * w)
+            b -= learning_rate * error.sum()
+        self.weights = w.astype(np.float32)
+        self.bias = float(b)
+        self.mean = self.mean.astype(np.float32)
+        self.std = self.std.astype(np.float32)
+        return self
+
+    def probability(self, features):
+        z = float(np.dot((features - self.mean) / self.std, self.weights)) + self.bias
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def predict(self, features):
+        return self.probability(features) >= 0.5
+
+    # ----------------- Disk cache -----------------
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, weights=self.weights, bias=np.float32(self.bias), mean=self.mean, std=self.std,
+                 info=np.array(json.dumps(self.info)))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        The cached model at 'path', or None if there is none (or it can't be read).
+        """
+        try:
+            with np.load(path) as data:
+                return cls(data["weights"], float(data["bias"]), data["mean"], data["std"],
+                           json.loads(str(data["info"])))
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def model_path(model_dir, patient_id):
+    safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", patient_id or "default")
+    return os.path.join(model_dir, f"eye_classifier_{safe}.npz")
+
+
+class ClassifierEyeBackend(BackendStats):
+    """
+    Eye backend (same interface as CascadeEyeBackend) around an EyeStateClassifier.
+    eye_count is 1 for open, 0 for closed: there are no separate eye boxes.
+    """
+
+    name = "personal"
+
+    def __init__(self, classifier):
+        super().__init__()
+        self.classifier = classifier
+
+    def eyes_open(self, gray, face):
+        t0 = time.perf_counter()
+        x, y, w, h = face
+        is_open = bool(self.classifier.predict(eye_features(gray[y:y+h, x:x+w])))
+        self._count(t0, is_open)
+        return (is_open, int(is_open))
+
+
+def _accuracy_and_ms(predict, crops, labels):
+    t0 = time.perf_counter()
+    correct = sum(1 for crop, label in zip(crops, labels) if bool(predict(crop)) == bool(label))
+    elapsed = time.perf_counter() - t0
+    return round(correct / float(len(crops)), 3), round(elapsed * 1000.0 / len(crops), 3)
+
+
+def train_eye_classifier(open_crops, closed_crops, cascade=None, holdout=0.25, min_accuracy=0.85):
+    """
+    Fit a classifier on the setup crops (each list in capture order), keeping the
+    last 'holdout' fraction of each setup aside to compare it with 'cascade'
+    (an eye backend) on the same crops. The held-out crops are a block at the end
+    rather than every n-th crop: neighbouring frames are near duplicates, and
+    testing on them would make the classifier look better than it is.
+
+    Returns (classifier, info); info has the held-out accuracy and ms per crop of
+    both and "use": whether the classifier should replace the cascade.
+    """
+    crops = list(open_crops) + list(closed_crops)
+    labels = [1] * len(open_crops) + [0] * len(closed_crops)
+    features = [eye_features(crop) for crop in crops]
+
+    train, test = [], []
+    start = 0
+    for count in (len(open_crops), len(closed_crops)):
+        split = start + count - max(1, int(count * holdout))
+        train.extend(range(start, split))
+        test.extend(range(split, start + count))
+        start += count
+    classifier = EyeStateClassifier().fit([features[i] for i in train], [labels[i] for i in train])
+
+    test_crops = [crops[i] for i in test]
+    test_labels = [labels[i] for i in test]
+    accuracy, ms = _accuracy_and_ms(lambda crop: classifier.predict(eye_features(crop)),
+                                    test_crops, test_labels)
+    info = {"open_crops": len(open_crops), "closed_crops": len(closed_crops),
+            "accuracy": accuracy, "ms_per_crop": ms, "trained": time.strftime("%Y-%m-%d %H:%M:%S")}
+    if cascade is not None:
+        whole = lambda crop: cascade.eyes_open(crop, (0, 0, crop.shape[1], crop.shape[0]))[0]
+        info["cascade_accuracy"], info["cascade_ms_per_crop"] = _accuracy_and_ms(whole, test_crops, test_labels)
+    info["use"] = accuracy >= min_accuracy and accuracy >= info.get("cascade_accuracy", 0.0)
+
+    # The held-out crops were only for checking - the model in use learns from all of them
+    classifier.fit(features, labels)
+    classifier.info = info
+    return classifier, info
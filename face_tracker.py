@@ -0,0 +1,74 @@
+# face_tracker.py
+
+
+class FaceTracker:
+    """
+    Limits the face search to a window around the last known face.
+
+    A full-frame detection runs every 'redetect_interval' frames, or as soon as
+    the windowed search loses the face. In between, only the last face boxes
+    (expanded by 'margin' of their size on every side) are searched, which is a
+    small crop instead of the whole image pyramid.
+    """
+
+    def __init__(self, redetect_interval=10, margin=0.5):
+        self.redetect_interval = redetect_interval
+        self.margin = margin
+
+        self.last_box = None          # (x0, y0, x1, y1) union of the last faces
+        self.frames_since_full = 0
+
+        # Counters, to see how often each path runs
+        self.full_detections = 0
+        self.window_detections = 0
+        self.lost_count = 0
+
+    def reset(self):
+        self.last_box = None
+        self.frames_since_full = 0
+
+    def find_faces(self, gray, detect_fn):
+        """
+        detect_fn(gray_image) -> list of (x, y, w, h) in that image's coordinates.
+        Returns faces in full-frame coordinates.
+        """
+        if self.last_box is not None and self.frames_since_full < self.redetect_interval:
+            x0, y0, x1, y1 = self._search_window(gray.shape)
+            faces = detect_fn(gray[y0:y1, x0:x1])
+            if len(faces) > 0:
+                faces = [(x + x0, y + y0, w, h) for (x, y, w, h) in faces]
+                self.window_detections += 1
+                self.frames_since_full += 1
+                self._remember(faces)
+                return faces
+            # Tracking lost => fall through to a full-frame search right away
+            self.lost_count += 1
+
+        faces = [tuple(f) for f in detect_fn(gray)]
+        self.full_detections += 1
+        self.frames_since_full = 0
+        self._remember(faces)
+        return faces
+
+    def _remember(self, faces):
+        if len(faces) == 0:
+            self.last_box = None
+            return
+        self.last_box = (
+            min(x for (x, y, w, h) in faces),
+            min(y for (x, y, w, h) in faces),
+            max(x + w for (x, y, w, h) in faces),
+            max(y + h for (x, y, w, h) in faces),
+        )
+
+    def _search_window(self, shape):
+        height, width = shape[:2]
+        x0, y0, x1, y1 = self.last_box
+        pad_x = int((x1 - x0) * self.margin)
+        pad_y = int((y1 - y0) * self.margin)
+        return (
+            max(0, x0 - pad_x),
+            max(0, y0 - pad_y),
+            min(width, x1 + pad_x),
+            min(height, y1 + pad_y),
+        )
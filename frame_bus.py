@@ -0,0 +1,175 @@
+# frame_bus.py
+"""
+Camera frames in shared memory, for consumers in other processes.
+
+One multiprocessing.shared_memory block holds a ring of 'slots' frame
+buffers, each big enough for the largest frame, plus a small table with the
+sequence number, capture time and size of the frame in every slot:
+
+    [latest seq][slot table: seq, time, height, width] x slots [frame 0][frame 1]...
+
+The writer (the capture side) puts each frame into the next slot exactly once;
+readers get numpy views straight into the block (no copy, no pickling) by
+sequence number. A slot's seq is set to -1 while it is being written, so a
+reader can tell with is_current(seq) whether the frame it used was replaced
+underneath it (only possible if it held on to it for 'slots' frames).
+"""
+
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+HEADER_BYTES = 64
+SLOT_DTYPE = np.dtype([("seq", "<i8"), ("time", "<f8"), ("height", "<i4"), ("width", "<i4")])
+
+
+def _open_shared_memory(name):
+    # Python 3.13+: don't let this process' resource tracker unlink the creator's block
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class FrameBus:
+    def __init__(self, width, height, slots=8, channels=3, name=None, create=True):
+        """
+        width, height => largest frame that will be written (smaller ones fit too)
+        Use FrameBus.attach(bus.spec()) in the other processes.
+        """
+        self.width = int(width)
+        self.height = int(height)
+        self.slots = slots
+        self.channels = channels
+        self.slot_bytes = self.width * self.height * channels
+        size = HEADER_BYTES + slots * SLOT_DTYPE.itemsize + slots * self.slot_bytes
+
+        self.owner = create
+        if create:
+            self.shm = shared_memory.SharedMemory(create=True, size=size, name=name)
+        else:
+            self.shm = _open_shared_memory(name)
+
+        buf = self.shm.buf
+        self._latest = np.ndarray((1,), dtype="<i8", buffer=buf, offset=0)
+        self._table = np.ndarray((slots,), dtype=SLOT_DTYPE, buffer=buf, offset=HEADER_BYTES)
+        self._data = np.ndarray(
+            (slots, self.slot_bytes), dtype=np.uint8, buffer=buf,
+            offset=HEADER_BYTES + slots * SLOT_DTYPE.itemsize
+        )
+        if create:
+            self._latest[0] = 0
+            self._table["seq"] = -1
+
+    def spec(self):
+        """
+        Picklable description for attach() in another process.
+        """
+        return {"name": self.shm.name, "width": self.width, "height": self.height,
+                "slots": self.slots, "channels": self.channels}
+
+    @classmethod
+    def attach(cls, spec):
+        return cls(spec["width"], spec["height"], spec["slots"], spec["channels"],
+                   name=spec["name"], create=False)
+
+    # ----------------- Writer -----------------
+    def slot_for_write(self, height, width):
+        """
+        (seq, view) of the next slot; fill the view (e.g. cv2.flip(..., dst=view))
+        then call publish(seq, capture_time).
+        """
+        if height > self.height or width > self.width:
+            raise ValueError(f"Frame {width}x{height} larger than the bus ({self.width}x{self.height})")
+        seq = int(self._latest[0]) + 1
+        i = seq % self.slots
+        table = self._table
+        table["seq"][i] = -1
+        table["height"][i] = height
+        table["width"][i] = width
+        return seq, self._data[i, :height * width * self.channels].reshape(height, width, self.channels)
+
+    def publish(self, seq, capture_time):
+        i = seq % self.slots
+        self._table["time"][i] = capture_time
+        self._table["seq"][i] = seq
+        self._latest[0] = seq
+
+    def write(self, frame, capture_time):
+        """
+        Copy 'frame' into the next slot and publish it. Returns its seq.
+        """
+        seq, view = self.slot_for_write(frame.shape[0], frame.shape[1])
+        np.copyto(view, frame)
+        self.publish(seq, capture_time)
+        return seq
+
+    # ----------------- Readers -----------------
+    def latest_seq(self):
+        return int(self._latest[0])
+
+    def read(self, seq):
+        """
+        (capture_time, frame view) of frame 'seq', or None if it has been replaced.
+        """
+        i = seq % self.slots
+        table = self._table
+        if int(table["seq"][i]) != seq:
+            return None
+        height, width, capture_time = int(table["height"][i]), int(table["width"][i]), float(table["time"][i])
+        view = self._data[i, :height * width * self.channels].reshape(height, width, self.channels)
+        if int(self._table["seq"][i]) != seq:
+            return None
+        return capture_time, view
+
+    def is_current(self, seq):
+        """
+        True while frame 'seq' is still in its slot (i.e. a view of it was not overwritten).
+        """
+        return int(self._table["seq"][seq % self.slots]) == seq
+
+    def wait_newer(self, seq, timeout=0.1, poll=0.002):
+        """
+        Wait for a frame newer than 'seq'. Returns (seq, capture_time, view) of the
+        newest one, or None on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            latest = self.latest_seq()
+            if latest > seq:
+                frame = self.read(latest)
+                if frame is not None:
+                    return (latest,) + frame
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(poll)
+
+    def close(self):
+        # Views must be dropped before the block can be closed
+        self._latest = self._table = self._data = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # A consumer still holds a frame view; the OS frees the block at exit
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+class BusWriter:
+    """
+    Stand-in for the capture thread's output queue (see pipeline.CaptureThread):
+    every FramePacket put() is written into the bus.
+    """
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.dropped = 0
+
+    def put(self, packet):
+        try:
+            self.bus.write(packet.frame, packet.capture_time)
+        except ValueError:
+            # Camera switched to a resolution bigger than the bus
+            self.dropped += 1
@@ -1,28 +1,92 @@
+import sys
+
 import matplotlib.pyplot as plt
 
-# Data for the first graph
-x = [0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100, 110, 120, 130, 140, 150]
-y1 = [88, 98, 97, 89, 89, 94, 98, 92, 97, 97, 97, 88, 91, 97, 87, 95]
-y2 = [95, 98, 92, 99, 91, 99, 93, 94, 90, 92, 89, 92, 99, 98, 94, 97]
 
-# Create the plot
-plt.figure(figsize=(10, 6))
+def plot_lux_accuracy():
+    # Data for the first graph
+    x = [0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100, 110, 120, 130, 140, 150]
+    y1 = [88, 98, 97, 89, 89, 94, 98, 92, 97, 97, 97, 88, 91, 97, 87, 95]
+    y2 = [95, 98, 92, 99, 91, 99, 93, 94, 90, 92, 89, 92, 99, 98, 94, 97]
+
+    # Create the plot
+    plt.figure(figsize=(10, 6))
+
+    # Plot the first graph
+    plt.plot(x, y1, marker='o', label='Open eyes', linestyle='-', linewidth=2)
+    # Plot the second graph
+    plt.plot(x, y2, marker='o', label='Closed eyes', linestyle='-', linewidth=2)
+
+    # Add titles and labels
+    plt.title('Accuracy rate as a function of light quantity', fontsize=16)
+    plt.xlabel('Light [Lux]', fontsize=12)
+    plt.ylabel('Hit rate [%]', fontsize=12)
+
+    # Add a legend
+    plt.legend(fontsize=12)
+
+    # Show the grid
+    plt.grid(True, linestyle='--', alpha=0.7)
+
+    # Display the plot
+    plt.show()
+
+
+def plot_session(path, bin_seconds=60):
+    """
+    State timeline and per-bin hit rates of a session file (see session_recorder.py).
+    """
+    import numpy as np
+
+    from cv_close_eye_detect import STATE_CODES
+    from session_recorder import load_session
+
+    records = load_session(path)
+    if len(records) == 0:
+        print(f"{path}: no records")
+        return
+
+    minutes = (records["time"] - records["time"][0]) / 60.0
+    state = records["state"]
+
+    # Hit rates per bin, vectorized over the whole night
+    bins = ((records["time"] - records["time"][0]) // bin_seconds).astype(np.int64)
+    n_bins = int(bins[-1]) + 1
+    frames_per_bin = np.maximum(np.bincount(bins, minlength=n_bins), 1)
+    bin_minutes = np.arange(n_bins) * bin_seconds / 60.0
+
+    fig, (ax_state, ax_rate) = plt.subplots(2, 1, figsize=(12, 7), sharex=True)
+
+    # State timeline
+    ax_state.step(minutes, state, where='post', linewidth=1)
+    ax_state.set_yticks(sorted(STATE_CODES.values()))
+    ax_state.set_yticklabels([name for name, _ in sorted(STATE_CODES.items(), key=lambda kv: kv[1])])
+    ax_state.set_title(f'Session {path}', fontsize=14)
+    ax_state.grid(True, linestyle='--', alpha=0.7)
 
-# Plot the first graph
-plt.plot(x, y1, marker='o', label='Open eyes', linestyle='-', linewidth=2)
-# Plot the second graph
-plt.plot(x, y2, marker='o', label='Closed eyes', linestyle='-', linewidth=2)
+    # Hit rates
+    for name, code in sorted(STATE_CODES.items(), key=lambda kv: kv[1]):
+        counts = np.bincount(bins[state == code], minlength=n_bins)
+        ax_rate.plot(bin_minutes, 100.0 * counts / frames_per_bin, label=name.replace('_', ' '), linewidth=2)
+    # Same rule as run mode: open or no face is awake, someone else's face is neither
+    awake = np.bincount(bins[(state == STATE_CODES["open"]) | (state == STATE_CODES["no_face"])], minlength=n_bins)
+    ax_rate.plot(bin_minutes, 100.0 * awake / frames_per_bin, label='hit (open or no face)',
+                 linestyle='--', linewidth=1)
 
-# Add titles and labels
-plt.title('Accuracy rate as a function of light quantity', fontsize=16)
-plt.xlabel('Light [Lux]', fontsize=12)
-plt.ylabel('Hit rate [%]', fontsize=12)
+    ax_rate.set_xlabel('Time [min]', fontsize=12)
+    ax_rate.set_ylabel(f'Frames per {bin_seconds}s [%]', fontsize=12)
+    ax_rate.legend(fontsize=10)
+    ax_rate.grid(True, linestyle='--', alpha=0.7)
 
-# Add a legend
-plt.legend(fontsize=12)
+    plt.tight_layout()
+    plt.show()
 
-# Show the grid
-plt.grid(True, linestyle='--', alpha=0.7)
 
-# Display the plot
-plt.show()
+if __name__ == "__main__":
+    # python graphs.py                      => lux accuracy curve
+    # python graphs.py sessions/x.eyesrec   => session timeline
+    if len(sys.argv) > 1:
+        for session_path in sys.argv[1:]:
+            plot_session(session_path)
+    else:
+        plot_lux_accuracy()
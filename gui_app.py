@@ -1,54 +1,71 @@
 # gui_app.py
 
+import time
+
+# Measured from here to the first displayed frame (logged as startup_to_first_frame)
+APP_START = time.perf_counter()
+
 import customtkinter as ctk
+import tkinter as tk
 import threading
 import cv2
-import time
-import pygame
 import os
-from PIL import Image, ImageTk
-
-# For audio device detection
-import sounddevice as sd
+import secrets
+import sys
 
-# For audio level
-import comtypes
-from ctypes import cast, POINTER
-from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
-from comtypes import CLSCTX_ALL
+# comtypes/pycaw (audio level, Windows only) are imported where they are used,
+# so the app starts without them
 
+import auto_tune
+from alert_player import AlertPlayer, default_output_device_name
+from checkpoint import Checkpointer, load_checkpoint
+from clip_recorder import ClipRecorder
+from detection_process import ProcessPipeline
 from cv_close_eye_detect import EyeDetector
+from event_log import get_event_log
+from perf_stats import PeriodicExporter, get_stage_timer
+from pipeline import FramePipeline
+from preview_renderer import PreviewRenderer
+from rate_governor import RateGovernor
+from status_server import StatusServer, detector_status
 
+# Alert policy menu entries => alert_engine policy names
+ALERT_POLICY_CHOICES = {
+    "15s blocks": "block",
+    "Sliding window": "sliding",
+}
 
-def force_reload_sounddevice_devices():
-    """
-    Force re-init of PortAudio via sounddevice,
-    so query_devices() sees any newly added/removed devices.
-    """
-    try:
-        sd._terminate()
-        sd._initialize()
-    except Exception as e:
-        print(f"[Warning] Could not re-initialize sounddevice: {e}")
 
 class EyeDetectionApp(ctk.CTk):
-    def __init__(self):
+    def __init__(self, detection_process=False, patient_id=None, caregiver_lan=False):
+        """
+        detection_process => run EyeDetector in its own process, frames shared
+            through shared memory (see detection_process.py)
+        patient_id => name the patient's eye classifier is cached under (see eye_classifier.py);
+            None => the classifier is only kept for this session
+        caregiver_lan => the caregiver stream listens on the whole network, protected by
+            a random token shown when it starts (otherwise it's reachable from this PC only)
+        """
         super().__init__()
 
         self.title("Eye Detection with Audio Device & Level")
         self.geometry("1000x600")
 
-        # Initialize Pygame for MP3 playback
-        pygame.mixer.init()
+        # Alert sound: decoded once, played from its own thread, repeated louder
+        # until Stop/Reset; follows the default output device
+        self.alert_player = AlertPlayer({"song": "song.mp3"})
+        self.alert_player.on_device_change = self.on_audio_device_change
+        self.alert_player.start()
 
         # State variables
+        self.first_frame_shown = False
         self.running_preview = True
         self.detection_active = False
         self.awake_time_value = 30  # 30..300
         self.sleep_value = 0        # 0..900
 
-        # Single EyeDetector instance
-        self.eye_detector = EyeDetector()
+        # Single EyeDetector instance (boxes are drawn by the preview, not on the frame)
+        self.eye_detector = EyeDetector(draw_boxes=False, patient_id=patient_id)
 
         # Layout
         self.grid_columnconfigure(0, weight=1)
@@ -56,8 +73,11 @@ class EyeDetectionApp(ctk.CTk):
         self.grid_rowconfigure(0, weight=1)
 
         # Camera Preview (left)
-        self.camera_label = ctk.CTkLabel(self, text="")
+        # Plain Tk label: its PhotoImage is updated in place by PreviewRenderer
+        self.camera_label = tk.Label(self, bd=0, bg="black")
+        self.camera_label.image = None
         self.camera_label.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
+        self.preview_renderer = PreviewRenderer(size=(500, 400), max_fps=15.0)
 
         # Controls frame (right)
         self.controls_frame = ctk.CTkFrame(self, width=300)
@@ -97,6 +117,18 @@ class EyeDetectionApp(ctk.CTk):
         self.sleep_value_label = ctk.CTkLabel(self.controls_frame, text="0 sec")
         self.sleep_value_label.pack(pady=(0,10))
 
+        # Run-mode alert policy
+        self.alert_policy_label = ctk.CTkLabel(self.controls_frame, text="Alert decision")
+        self.alert_policy_label.pack(pady=(10,0))
+        self.alert_policy_menu = ctk.CTkOptionMenu(
+            self.controls_frame,
+            values=list(ALERT_POLICY_CHOICES),
+            command=self.on_alert_policy_change
+        )
+        self.alert_policy_menu.set("15s blocks")
+        self.alert_policy_choice = "15s blocks"
+        self.alert_policy_menu.pack(pady=(0,10))
+
         # Buttons for setup/run
         self.button_setup_open = ctk.CTkButton(
             self.controls_frame, text="Setup Open Eyes", command=self.setup_open_handler
@@ -141,20 +173,107 @@ class EyeDetectionApp(ctk.CTk):
         )
         self.get_audio_level_button.pack(pady=10)
 
+        # Clips of the 30s before and 15s after each alert (or long no-face stretch)
+        self.clip_recorder = ClipRecorder(out_dir="clips")
+        self.clip_recorder.start()
+
+        # Caregiver view: status, events and preview over HTTP (off by default)
+        self.status_server = None
+        self.caregiver_lan = caregiver_lan
+        self.server_switch = ctk.CTkSwitch(
+            self.controls_frame, text="Caregiver stream (port 8080)", command=self.on_server_toggle
+        )
+        self.server_switch.pack(pady=5)
+
+        # Pipeline throughput / latency indicator
+        self.pipeline_stats_label = ctk.CTkLabel(self.controls_frame, text="Pipeline: ...")
+        self.pipeline_stats_label.pack(pady=5)
+
+        # Per-stage timing panel (off by default - instrumentation is free when off)
+        self.stage_timer = get_stage_timer()
+        self.perf_switch = ctk.CTkSwitch(
+            self.controls_frame, text="Show performance", command=self.on_perf_toggle
+        )
+        self.perf_switch.pack(pady=5)
+        self.perf_label = ctk.CTkLabel(self.controls_frame, text="", justify="left")
+        self.perf_label.pack(pady=5)
+        self.perf_exporter = PeriodicExporter(self.stage_timer, get_event_log(), interval=60.0)
+        self.perf_exporter.start()
+
         # Open camera
         self.cap = cv2.VideoCapture(0)
+        self.pipeline = None
+        self.rate_governor = None
+        self.detection_process = detection_process
         if not self.cap.isOpened():
             self.label_status.configure(text="Error: Cannot open camera.")
+        elif detection_process:
+            self.label_status.configure(text="Camera opened. Ready (detection process).")
+            # Detection gets its own process (and GIL); from here on eye_detector is its proxy
+            self.pipeline = ProcessPipeline(self.cap, {"draw_boxes": False, "patient_id": patient_id})
+            self.eye_detector = self.pipeline.detector
+            self.pipeline.start()
         else:
             self.label_status.configure(text="Camera opened. Ready.")
+            # Capture and detection run on their own threads; the Tk loop only displays
+            # The governor measures this machine for 20s, then holds ~10 detections/s
+            self.rate_governor = RateGovernor(target_rate=10.0, calibration_time=20.0)
+            self.pipeline = FramePipeline(self.cap, self.eye_detector, governor=self.rate_governor)
+            self.pipeline.start()
+
+        # Settings, setup results and the run window are checkpointed every 5s;
+        # a recent checkpoint (crash, reboot) is resumed right away
+        self.closing = False
+        self.checkpointer = Checkpointer(self.checkpoint_state)
+        self.resume_from_checkpoint()
+        self.checkpointer.start()
 
         # Start camera preview loop
         self.update_preview()
+        self.update_pipeline_stats()
 
         # Optionally: Periodic updates for Audio Output Device and Audio Level
         # Uncomment the following line if you want continuous updates every X seconds
         # self.update_audio_device_and_level()
 
+    # ----------------- Checkpoint / Resume -----------------
+    def checkpoint_state(self):
+        return {
+            # Set by the final save in on_closing: the user ended the run, don't resume it
+            "clean_shutdown": self.closing,
+            "detector": self.eye_detector.get_checkpoint(),
+            "settings": {
+                "awake_time": self.awake_time_value,
+                "sleep": self.sleep_value,
+                "alert_policy": self.alert_policy_choice,
+            },
+        }
+
+    def resume_from_checkpoint(self):
+        checkpoint = load_checkpoint()
+        if checkpoint is None:
+            return
+        settings = checkpoint["settings"]
+        self.on_awake_change(settings["awake_time"])
+        self.on_sleep_change(settings["sleep"])
+        if settings["alert_policy"] in ALERT_POLICY_CHOICES:
+            self.alert_policy_menu.set(settings["alert_policy"])
+            self.alert_policy_choice = settings["alert_policy"]
+        if self.pipeline is None:
+            return
+        detector_state = checkpoint["detector"]
+        if checkpoint.get("clean_shutdown"):
+            # Setups and tuning are kept, but only a crash or reboot continues a run
+            detector_state = dict(detector_state, mode=None)
+        if self.eye_detector.resume_from(detector_state):
+            self.open_session_recorder()
+            self.set_detection_active(True)
+            self.label_status.configure(
+                text=f"Resumed running detection ({self.eye_detector.alert_policy.window_summary()})"
+            )
+        else:
+            self.label_status.configure(text="Camera opened. Settings restored.")
+
     # ----------------- Slider Callbacks -----------------
     def on_awake_change(self, val):
         step = 30
@@ -170,43 +289,65 @@ class EyeDetectionApp(ctk.CTk):
         self.sleep_value = new_val
         self.sleep_value_label.configure(text=f"{new_val} sec")
 
+    def set_detection_active(self, active):
+        self.detection_active = active
+        if self.pipeline is not None:
+            self.pipeline.set_detection_active(active)
+
+    def on_alert_policy_change(self, choice):
+        self.alert_policy_choice = choice
+        self.eye_detector.set_alert_policy(ALERT_POLICY_CHOICES[choice])
+
     # ----------------- Setup Handlers -----------------
     def setup_open_handler(self):
         self.label_status.configure(text="Setup Open Eyes scheduled...")
-        self.detection_active = True
+        self.set_detection_active(True)
         if self.sleep_value > 0:
             threading.Thread(target=self.delayed_start, args=("setup_open",), daemon=True).start()
         else:
             self.do_setup_open()
 
     def do_setup_open(self):
-        self.label_status.configure(text="Setting up Open Eyes (15s)...")
+        self.label_status.configure(text="Setting up Open Eyes (up to 15s)...")
         self.eye_detector.start_detection("setup_open", awake_time=0)
 
     def setup_closed_handler(self):
         self.label_status.configure(text="Setup Closed Eyes scheduled...")
-        self.detection_active = True
+        self.set_detection_active(True)
         if self.sleep_value > 0:
             threading.Thread(target=self.delayed_start, args=("setup_closed",), daemon=True).start()
         else:
             self.do_setup_closed()
 
     def do_setup_closed(self):
-        self.label_status.configure(text="Setting up Closed Eyes (15s)...")
+        self.label_status.configure(text="Setting up Closed Eyes (up to 15s)...")
         self.eye_detector.start_detection("setup_closed", awake_time=0)
 
     # ----------------- Run Process -----------------
     def run_process_handler(self):
         self.label_status.configure(text="Run Process scheduled...")
-        self.detection_active = True
+        self.set_detection_active(True)
         if self.sleep_value > 0:
             threading.Thread(target=self.delayed_start, args=("run",), daemon=True).start()
         else:
             self.do_run()
 
     def do_run(self):
-        self.label_status.configure(text="Running detection (15s blocks) ...")
+        self.label_status.configure(text=f"Running detection ({self.alert_policy_menu.get()}) ...")
+        self.open_session_recorder()
         self.eye_detector.start_detection("run", awake_time=self.awake_time_value)
+        self.checkpointer.request_save()
+
+    def open_session_recorder(self):
+        # Every run frame goes to a session file (plot it with graphs.py)
+        session_path = os.path.join("sessions", time.strftime("session_%Y%m%d_%H%M%S.eyesrec"))
+        self.close_session_recorder()
+        self.eye_detector.record_session(session_path)
+
+    def close_session_recorder(self):
+        recorder = self.eye_detector.attach_recorder(None)
+        if recorder is not None:
+            recorder.close()
 
     def delayed_start(self, mode_str):
         time.sleep(self.sleep_value)
@@ -220,56 +361,160 @@ class EyeDetectionApp(ctk.CTk):
     # ----------------- Stop/Reset -----------------
     def stop_handler(self):
         self.label_status.configure(text="Stop/Reset requested...")
-        self.detection_active = False
+        self.set_detection_active(False)
         self.eye_detector.stop_detection()
-        pygame.mixer.music.stop()
+        self.close_session_recorder()
+        self.alert_player.acknowledge()
+        self.checkpointer.request_save()
 
     # ----------------- Camera Preview Loop -----------------
     def update_preview(self):
-        if self.running_preview and self.cap.isOpened():
-            ret, frame = self.cap.read()
-            if ret:
-                # Mirror the camera feed
-                frame = cv2.flip(frame, 1)
-
-                # Pass to EyeDetector if detection is active
+        """
+        Show the newest detection result and react to status codes.
+        Runs on the Tk loop, so it must never block on the camera or the cascades.
+        """
+        if self.running_preview and self.pipeline is not None:
+            # Preview refresh is throttled on its own; undisplayed results are
+            # simply replaced by newer ones in the pipeline's latest-wins queue
+            result = self.pipeline.latest_result() if self.preview_renderer.due() else None
+            if result is not None:
+                if self.first_frame_shown is False:
+                    self.first_frame_shown = True
+                    startup_ms = (time.perf_counter() - APP_START) * 1000.0
+                    get_event_log().info("gui_app", "startup_to_first_frame", ms=round(startup_ms, 1))
+
+                # Display processed frame (boxes drawn on the small preview buffer)
+                timer = self.stage_timer
+                t0 = timer.start()
+                photo = self.preview_renderer.render(result.frame, result.faces)
+                if self.camera_label.image is not photo:
+                    # Only the first time - afterwards the same PhotoImage is updated
+                    self.camera_label.configure(image=photo)
+                    self.camera_label.image = photo
+                timer.stop("preview_render", t0)
+                frame = result.frame
+                if self.detection_process and (self.status_server is not None or self.detection_active):
+                    # A view into the frame bus: copy it before other threads encode it
+                    frame = frame.copy()
+                if self.status_server is not None:
+                    self.status_server.publish_frame(frame, result.faces)
                 if self.detection_active:
-                    status, old_mode, processed_frame = self.eye_detector.process_frame(frame)
+                    self.clip_recorder.add_frame(frame, result.faces)
+                    self.clip_recorder.observe_state(self.eye_detector.last_state)
+                self.show_setup_progress()
+
+            # Check if detection returned a code
+            for event in self.pipeline.pending_events():
+                status, old_mode = event.status, event.old_mode
+                if old_mode in ("setup_open", "setup_closed"):
+                    # 0 => fail, 1 => success
+                    self.set_detection_active(False)
+                    self.checkpointer.request_save()
+                    if status == 1:
+                        self.label_status.configure(text=f"{old_mode} SUCCESS!")
+                        results = self.eye_detector.calibration_results
+                        if results.get("setup_open") and results.get("setup_closed"):
+                            self.start_auto_tune()
+                    else:
+                        self.label_status.configure(text=f"{old_mode} FAILED.")
+                elif old_mode == "run":
+                    if status == 2:
+                        self.label_status.configure(text="Run => threshold exceeded => playing song!")
+                        self.play_song()
+                        self.clip_recorder.trigger("alert")
+
+        # Short poll interval: nothing here waits on processing time any more
+        self.after(15, self.update_preview)
+
+    def show_setup_progress(self):
+        # Setups end as soon as the result is clear (see sequential_test.py)
+        detector = self.eye_detector
+        progress = detector.setup_progress
+        if detector.mode not in ("setup_open", "setup_closed") or progress is None:
+            return
+        name = "Open Eyes" if progress["mode"] == "setup_open" else "Closed Eyes"
+        text = f"Setting up {name}: {progress['elapsed']:.0f}s, {progress['ratio']:.0%} detected"
+        if progress["confidence"] is not None:
+            text += f", {progress['confidence']:.0%} sure it works"
+        self.label_status.configure(text=text)
+
+    # ----------------- Auto-tuning -----------------
+    def start_auto_tune(self):
+        """
+        Both setups passed: search cascade settings on their frames in the background.
+        """
+        self.label_status.configure(text="Tuning detector for this patient...")
+
+        def bg_tune():
+            try:
+                if self.detection_process:
+                    params = self.eye_detector.tune()
+                else:
+                    params = auto_tune.tune(self.eye_detector)
+            except Exception as e:
+                get_event_log().error("gui_app", "auto-tune failed", error=e)
+                self.label_status.configure(text="Tuning failed, keeping default settings.")
+                return
+            if not params["ok"]:
+                self.label_status.configure(text=f"Tuning skipped: {params['reason']}")
+                return
+            self.eye_detector.apply_tuning(params)
+            self.checkpointer.request_save()
+            self.label_status.configure(
+                text=f"Tuned: open {params['open_accuracy']:.0%}, closed {params['closed_accuracy']:.0%}, "
+                     f"{params['ms_per_frame']} ms/frame"
+            )
+
+        threading.Thread(target=bg_tune, daemon=True).start()
+
+    def on_server_toggle(self):
+        if self.server_switch.get():
+            try:
+                if self.caregiver_lan:
+                    token = secrets.token_urlsafe(8)
+                    server = StatusServer(host="0.0.0.0", port=8080, token=token,
+                                          status_fn=detector_status(self.eye_detector))
                 else:
-                    status, old_mode, processed_frame = (None, None, frame)
-
-                # Display processed_frame
-                frame_rgb = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2RGB)
-                pil_img = Image.fromarray(frame_rgb).resize((500, 400), Image.Resampling.LANCZOS)
-                ctk_img = ctk.CTkImage(light_image=pil_img, size=(500, 400))
-                self.camera_label.configure(image=ctk_img)
-                self.camera_label.image = ctk_img
-
-                # Check if detection returned a code
-                if status is not None:
-                    if old_mode in ("setup_open", "setup_closed"):
-                        # 0 => fail, 1 => success
-                        self.detection_active = False
-                        if status == 1:
-                            self.label_status.configure(text=f"{old_mode} SUCCESS!")
-                        else:
-                            self.label_status.configure(text=f"{old_mode} FAILED.")
-                    elif old_mode == "run":
-                        if status == 2:
-                            self.label_status.configure(text="Run => threshold exceeded => playing song!")
-                            self.play_song()
-
-        self.after(30, self.update_preview)
+                    token = None
+                    server = StatusServer(port=8080, status_fn=detector_status(self.eye_detector))
+                server.start()
+            except OSError as e:
+                get_event_log().error("gui_app", "Cannot start caregiver server", error=e)
+                self.server_switch.deselect()
+                return
+            self.status_server = server
+            self.eye_detector.event_listener = server.publish
+            if token is not None:
+                self.label_status.configure(text=f"Caregiver stream: http://<this PC>:8080/?token={token}")
+        else:
+            self.stop_status_server()
+
+    def stop_status_server(self):
+        server, self.status_server = self.status_server, None
+        self.eye_detector.event_listener = None
+        if server is not None:
+            server.stop()
+
+    def on_perf_toggle(self):
+        enabled = bool(self.perf_switch.get())
+        self.stage_timer.reset()
+        self.stage_timer.enabled = enabled
+        if not enabled:
+            self.perf_label.configure(text="")
+
+    def update_pipeline_stats(self):
+        if self.stage_timer.enabled:
+            self.perf_label.configure(text=self.stage_timer.format_summary())
+        if self.pipeline is not None:
+            text = f"Pipeline: {self.pipeline.stats.summary()}"
+            if self.rate_governor is not None:
+                text += f"\nRate: {self.rate_governor.summary()}"
+            self.pipeline_stats_label.configure(text=text)
+        self.after(1000, self.update_pipeline_stats)
 
     # ----------------- Song Playback -----------------
     def play_song(self):
-        try:
-            pygame.mixer.music.stop()
-            mp3_path = "song.mp3"
-            pygame.mixer.music.load(mp3_path)
-            pygame.mixer.music.play()
-        except Exception as e:
-            print(f"Error playing {mp3_path}: {e}")
+        self.alert_player.alert()
 
     # ----------------- Audio Output Device Detection -----------------
     def refresh_audio_device(self):
@@ -287,16 +532,15 @@ class EyeDetectionApp(ctk.CTk):
 
     def get_default_audio_output_device_name(self):
         """
-        Uses sounddevice to get the current default audio output device's name.
+        The current default audio output device's name (None if unknown).
         """
-        force_reload_sounddevice_devices()
-        try:
-            # print( (sd.query_devices()))
-            device_info = (sd.query_devices()[1]["name"])
-            return device_info
-        except Exception as e:
-            print(f"Sounddevice error: {e}")
-            return None
+        return default_output_device_name()
+
+    def on_audio_device_change(self, device_name):
+        """
+        Called by the alert player's device watcher (its own thread).
+        """
+        self.audio_device_label.configure(text=f"Audio Output Device: {device_name or 'Unknown'}")
 
     # ----------------- Audio Level Display -----------------
     def show_audio_level(self):
@@ -314,6 +558,9 @@ class EyeDetectionApp(ctk.CTk):
         Uses PyCaw to get the master volume level in [0..100].
         """
         try:
+            from ctypes import cast, POINTER
+            from comtypes import CLSCTX_ALL
+            from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
             devices = AudioUtilities.GetSpeakers()
             interface = devices.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None)
             volume = cast(interface, POINTER(IAudioEndpointVolume))
@@ -351,14 +598,27 @@ class EyeDetectionApp(ctk.CTk):
     # ----------------- Window Close -----------------
     def on_closing(self):
         self.running_preview = False
+        self.closing = True
+        # Final checkpoint and session close first: with a detection process they're done there
+        self.checkpointer.stop()
+        self.close_session_recorder()
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        self.clip_recorder.stop()
+        self.stop_status_server()
         if self.cap.isOpened():
             self.cap.release()
-        pygame.mixer.quit()
+        self.alert_player.stop()
+        self.perf_exporter.stop()
+        get_event_log().close()
         self.destroy()
 
 if __name__ == "__main__":
     ctk.set_appearance_mode("System")
     ctk.set_default_color_theme("blue")
-    app = EyeDetectionApp()
+    argv = sys.argv[1:]
+    patient = argv[argv.index("--patient") + 1] if "--patient" in argv[:-1] else None
+    app = EyeDetectionApp(detection_process="--detect-process" in argv, patient_id=patient,
+                          caregiver_lan="--caregiver-lan" in argv)
     app.protocol("WM_DELETE_WINDOW", app.on_closing)
     app.mainloop()
@@ -0,0 +1,228 @@
+# headless.py
+"""
+Headless monitoring daemon: camera + EyeDetector + alert, no GUI stack.
+
+Only OpenCV is needed. Alerts go through alert_player.AlertPlayer like in the
+GUI (sound decoded up front on the player's thread, repeated every 20s up to
+--alert-repeats times, as there is no Stop button); without pygame the terminal bell is rung instead.
+Time from process start to the first processed frame (minus --delay) is
+logged to the event log as "startup_to_first_frame".
+
+Example:
+    python headless.py --camera 0 --awake-time 60 --song song.mp3
+"""
+
+import time
+
+# Measured from here, before any heavy import
+PROCESS_START = time.perf_counter()
+
+import argparse
+import os
+import signal
+import sys
+
+
+class BellSink:
+    """
+    Alert sink for boxes without pygame: rings the terminal bell (see alert_player.NullSink).
+    """
+
+    def load(self, name, path):
+        pass
+
+    def play(self, name, volume):
+        sys.stdout.write("\a")
+        sys.stdout.flush()
+
+    def stop(self):
+        pass
+
+    def reinit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def make_alert_player(song, repeats, log):
+    """
+    AlertPlayer on pygame if it is installed; it is only imported by the
+    player's own thread, so startup doesn't wait for it.
+    """
+    import importlib.util
+
+    from alert_player import AlertPlayer, PygameSink
+
+    if importlib.util.find_spec("pygame") is not None:
+        sink = PygameSink()
+    else:
+        log.warning("headless", "pygame not installed, alerts ring the terminal bell")
+        sink = BellSink()
+    return AlertPlayer({"song": song}, sink=sink, max_repeats=repeats,
+                       watch_devices=isinstance(sink, PygameSink), event_log=log)
+
+
+def _is_loopback(host):
+    # Same rule as status_server (not imported here: it pulls in OpenCV)
+    import ipaddress
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run eye monitoring without the GUI")
+    parser.add_argument("--camera", default="0", help="camera index or video source")
+    parser.add_argument("--awake-time", type=int, default=30, help="seconds (30..300)")
+    parser.add_argument("--alert-policy", default="block", choices=("block", "sliding"))
+    parser.add_argument("--song", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "song.mp3"))
+    parser.add_argument("--alert-repeats", type=int, default=3,
+                        help="repeat an alert this many times, every 20s (there is no Stop button)")
+    parser.add_argument("--delay", type=int, default=0, help="seconds to wait before monitoring starts")
+    parser.add_argument("--no-governor", action="store_true", help="detect on every frame, no rate calibration")
+    parser.add_argument("--face-backend", default="haar", help="haar, lbp or dnn")
+    parser.add_argument("--eye-backend", default="eye_tree", help="eye_tree or eye")
+    parser.add_argument("--patient", metavar="NAME",
+                        help="cache the patient's eye classifier under this name and reuse it next time "
+                             "(default: kept for this session only)")
+    parser.add_argument("--checkpoint", metavar="PATH",
+                        help="save the run state here and resume from it if it's recent")
+    parser.add_argument("--clips", metavar="DIR", help="save a clip around each alert in this folder")
+    parser.add_argument("--detect-process", action="store_true",
+                        help="run detection in its own process, frames shared through shared memory")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="serve status, events and an MJPEG preview on this port (this machine only)")
+    parser.add_argument("--serve-host", default="127.0.0.1", metavar="HOST",
+                        help="interface to serve on, e.g. 0.0.0.0 for the whole network (needs --serve-token)")
+    parser.add_argument("--serve-token", metavar="TOKEN",
+                        help="password viewers must give (basic auth, or ?token=TOKEN in the URL)")
+    args = parser.parse_args()
+    if args.serve and not args.serve_token and not _is_loopback(args.serve_host):
+        # Checked before anything starts (StatusServer would refuse it too)
+        parser.error("--serve-host other than this machine needs --serve-token")
+
+    import cv2
+
+    from event_log import get_event_log
+
+    log = get_event_log()
+    source = int(args.camera) if args.camera.isdigit() else args.camera
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        log.error("headless", "Cannot open camera", source=args.camera)
+        log.close()
+        return 1
+
+    detector_kwargs = {
+        "alert_policy": args.alert_policy,
+        "face_backend": args.face_backend,
+        "eye_backend": args.eye_backend,
+        "patient_id": args.patient,
+    }
+    if args.detect_process:
+        # No rate governor: the detection process has a core to itself
+        from detection_process import ProcessPipeline
+        # Frames live in shared slots: boxes are drawn on copies by the consumers instead
+        detector_kwargs["draw_boxes"] = False
+        pipeline = ProcessPipeline(cap, detector_kwargs)
+        detector = pipeline.detector
+    else:
+        from cv_close_eye_detect import EyeDetector
+        from pipeline import FramePipeline
+        from rate_governor import RateGovernor
+        detector = EyeDetector(**detector_kwargs)
+        governor = None if args.no_governor else RateGovernor(target_rate=10.0, calibration_time=20.0)
+        pipeline = FramePipeline(cap, detector, governor=governor)
+    pipeline.start()
+    alert = make_alert_player(args.song, args.alert_repeats, log)
+    alert.start()
+
+    server = None
+    if args.serve:
+        from status_server import StatusServer, detector_status
+        server = StatusServer(host=args.serve_host, port=args.serve, token=args.serve_token,
+                              status_fn=detector_status(detector))
+        server.start()
+        detector.event_listener = server.publish
+
+    running = [True]
+
+    def on_signal(signum, frame):
+        running[0] = False
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    clips = None
+    if args.clips:
+        from clip_recorder import ClipRecorder
+        clips = ClipRecorder(out_dir=args.clips)
+        clips.start()
+
+    checkpointer = None
+    resumed = False
+    if args.checkpoint:
+        from checkpoint import Checkpointer, load_checkpoint
+        state = load_checkpoint(args.checkpoint)
+        resumed = state is not None and detector.resume_from(state["detector"])
+        checkpointer = Checkpointer(lambda: {"detector": detector.get_checkpoint()}, path=args.checkpoint)
+
+    if not resumed:
+        if args.delay > 0:
+            log.info("headless", f"Waiting {args.delay}s before monitoring")
+            time.sleep(args.delay)
+        detector.start_detection("run", awake_time=args.awake_time)
+    pipeline.set_detection_active(True)
+    if checkpointer is not None:
+        checkpointer.start()
+
+    first_frame_logged = False
+    try:
+        while running[0]:
+            result = pipeline.results.get(timeout=0.5)
+            # faces is None on frames passed through while detection was off
+            # (e.g. rate governor calibration) - only a detected frame counts
+            if result is not None and result.faces is not None and not first_frame_logged:
+                first_frame_logged = True
+                delay = 0 if resumed else args.delay
+                startup_ms = (time.perf_counter() - PROCESS_START - delay) * 1000.0
+                log.info("headless", "startup_to_first_frame", ms=round(startup_ms, 1))
+            frame, faces = (result.frame, None) if result is not None else (None, None)
+            if frame is not None and args.detect_process and (server is not None or clips is not None):
+                # A view into the frame bus: copy it before other threads encode it
+                frame, faces = frame.copy(), result.faces
+            if frame is not None and server is not None:
+                # Without a detection process the boxes are already drawn by the detector
+                server.publish_frame(frame, faces)
+            if frame is not None and clips is not None:
+                clips.add_frame(frame, faces)
+                clips.observe_state(detector.last_state)
+
+            for event in pipeline.pending_events():
+                if event.old_mode == "run" and event.status == 2:
+                    log.warning("headless", "Run => threshold exceeded => playing song!")
+                    alert.alert()
+                    if clips is not None:
+                        clips.trigger("alert")
+    finally:
+        # Final checkpoint first: with --detect-process it comes from the detection process
+        if checkpointer is not None:
+            checkpointer.stop()
+        pipeline.stop()
+        if clips is not None:
+            clips.stop()
+        if server is not None:
+            server.stop()
+        alert.stop()
+        cap.release()
+        detector.stop_detection()
+        log.info("headless", "stopped")
+        log.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+# motion_gate.py
+
+import cv2
+
+
+class MotionGate:
+    """
+    Decides whether a frame needs the face/eye cascades at all.
+
+    Each grayscale frame is shrunk to a tiny thumbnail ('size') and compared with
+    the thumbnail of the last frame that was actually detected on. If fewer than
+    'changed_frac' of its pixels moved by more than 'pixel_threshold' grey levels,
+    the scene is static and the last detection result can be reused. Comparing
+    against the last detected frame (not the previous one) means slow drift adds
+    up until it triggers a detection.
+
+    A detection is forced at least every 'max_skip' seconds whatever the
+    thumbnail says, so a small change (eyes opening) is never missed for longer
+    than that. All buffers are allocated once, on the first frame.
+    """
+
+    def __init__(self, size=(80, 60), pixel_threshold=12, changed_frac=0.002, max_skip=1.0):
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.changed_frac = changed_frac
+        self.max_skip = max_skip
+
+        self._small = None
+        self._reference = None
+        self._diff = None
+        self._min_changed = max(1, int(size[0] * size[1] * changed_frac))
+        self.last_detection_time = None
+
+        # Counters, to see how much the gate saves
+        self.detections = 0
+        self.skips = 0
+
+    def reset(self):
+        """
+        Forget the reference frame => the next frame is always detected.
+        """
+        self.last_detection_time = None
+
+    def needs_detection(self, gray, now):
+        """
+        True if 'gray' must go through the cascades; the caller must then call
+        detected(now) once it has a fresh result.
+        """
+        if self._small is None:
+            self._small = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
+            self._reference = self._small.copy()
+            self._diff = self._small.copy()
+        else:
+            cv2.resize(gray, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+
+        if self.last_detection_time is None or now - self.last_detection_time >= self.max_skip:
+            return True
+
+        cv2.absdiff(self._small, self._reference, dst=self._diff)
+        cv2.threshold(self._diff, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=self._diff)
+        if cv2.countNonZero(self._diff) >= self._min_changed:
+            return True
+
+        self.skips += 1
+        return False
+
+    def detected(self, now):
+        """
+        The frame last passed to needs_detection() was detected on: it becomes the reference.
+        """
+        if self._small is None:
+            # needs_detection() was never asked - nothing to keep
+            return
+        self._reference[:] = self._small
+        self.last_detection_time = now
+        self.detections += 1
+
+    def skip_rate(self):
+        total = self.detections + self.skips
+        return round(self.skips / total, 3) if total else 0.0
@@ -0,0 +1,268 @@
+# multi_camera.py
+"""
+Monitor several beds from one host: one process per camera.
+
+Each camera runs its own EyeDetector (own run state, thresholds and event log)
+in a separate process, so the cascades don't fight over one GIL. Workers send
+small status dicts back to the supervisor, each camera over its own queues:
+  - a heartbeat with the current state and fps about once a second
+    (bounded queue; dropped if the supervisor is behind)
+  - an alert message whenever run mode returns status 2 (unbounded queue, never dropped)
+
+A camera that stops sending heartbeats (stalled read, crashed driver) is
+restarted by the supervisor: it is asked to stop, and only killed if it doesn't.
+Its queues are replaced with the process, since killing a process can leave
+a queue it was writing to unusable; the other cameras never share them.
+
+Example:
+    python multi_camera.py --camera 0 --camera 1
+    python multi_camera.py --config cameras.json
+
+cameras.json:
+    [{"id": "bed1", "source": 0, "awake_time": 60},
+     {"id": "bed2", "source": 1, "awake_time": 30, "alert_policy": "sliding",
+      "face_backend": "lbp", "threads": 2}]
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import time
+
+DEFAULT_CAMERA = {
+    "awake_time": 30,
+    "alert_policy": "block",
+    "face_backend": "haar",
+    "eye_backend": "eye_tree",
+    "flip": True,
+}
+
+
+def camera_worker(config, status_queue, alert_queue, stop_event):
+    """
+    Process entry point for one camera. Imports OpenCV here so the supervisor
+    process stays light.
+    """
+    import cv2
+
+    # OpenCV would start a thread per core in every camera process; share the cores instead
+    cv2.setNumThreads(config.get("threads", 1))
+
+    from cv_close_eye_detect import EyeDetector
+    from event_log import EventLog
+
+    camera_id = config["id"]
+    log = EventLog(path=f"eye_events_{camera_id}.log")
+    detector = EyeDetector(
+        alert_policy=config["alert_policy"],
+        face_backend=config["face_backend"],
+        eye_backend=config["eye_backend"],
+        event_log=log
+    )
+
+    cap = cv2.VideoCapture(config["source"])
+    if not cap.isOpened():
+        _send(status_queue, {"camera": camera_id, "type": "error", "message": "cannot open camera"})
+        return
+    detector.start_detection("run", awake_time=config["awake_time"])
+
+    frames = 0
+    last_report = time.monotonic()
+    try:
+        while not stop_event.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                time.sleep(0.05)
+                continue
+            if config["flip"]:
+                frame = cv2.flip(frame, 1)
+
+            status, _, _ = detector.process_frame(frame)
+            frames += 1
+            if status == 2:
+                # Unbounded queue: never blocks, never dropped
+                alert_queue.put({"camera": camera_id, "type": "alert", "time": time.time()})
+
+            now = time.monotonic()
+            if now - last_report >= 1.0:
+                _send(status_queue, {
+                    "camera": camera_id,
+                    "type": "heartbeat",
+                    "time": time.time(),
+                    "state": detector.last_state,
+                    "fps": round(frames / (now - last_report), 1),
+                    "window": detector.alert_policy.window_summary(),
+                })
+                frames = 0
+                last_report = now
+    finally:
+        cap.release()
+        log.close()
+
+
+def _send(status_queue, message):
+    """
+    Heartbeats and errors are dropped if the supervisor is behind.
+    """
+    try:
+        status_queue.put_nowait(message)
+    except queue.Full:
+        pass
+
+
+class MultiCameraSupervisor:
+    def __init__(self, cameras, stall_timeout=10.0):
+        """
+        cameras => list of dicts with at least "id" and "source"
+        stall_timeout => restart a camera process after this many seconds without a heartbeat
+        """
+        threads = max(1, (os.cpu_count() or 1) // max(1, len(cameras)))
+        # OpenCV threads per camera process: an equal share of the cores
+        self.cameras = [dict(DEFAULT_CAMERA, **dict({"threads": threads}, **c)) for c in cameras]
+        self.stall_timeout = stall_timeout
+        self.processes = {}
+        self.channels = {}      # camera id => (status queue, alert queue, stop event)
+        self.status = {}        # camera id => last heartbeat / error dict
+        self.last_seen = {}     # camera id => monotonic time of last message
+        self.restarts = {c["id"]: 0 for c in self.cameras}
+
+    def start(self):
+        for config in self.cameras:
+            self._start_camera(config)
+
+    def _start_camera(self, config):
+        channels = (mp.Queue(maxsize=16), mp.Queue(), mp.Event())
+        process = mp.Process(
+            target=camera_worker,
+            args=(config,) + channels,
+            name=f"camera-{config['id']}",
+            daemon=True
+        )
+        process.start()
+        self.processes[config["id"]] = process
+        self.channels[config["id"]] = channels
+        self.last_seen[config["id"]] = time.monotonic()
+
+    def poll(self):
+        """
+        Drain pending messages. Returns the alert messages received.
+        """
+        alerts = []
+        for camera_id, (status_queue, alert_queue, _) in self.channels.items():
+            alerts.extend(self._drain(camera_id, alert_queue))
+            for message in self._drain(camera_id, status_queue):
+                self.status[camera_id] = message
+        self._restart_stalled(alerts)
+        return alerts
+
+    def _drain(self, camera_id, q):
+        messages = []
+        while True:
+            try:
+                messages.append(q.get_nowait())
+            except queue.Empty:
+                break
+        if messages:
+            self.last_seen[camera_id] = time.monotonic()
+        return messages
+
+    def _restart_stalled(self, alerts):
+        now = time.monotonic()
+        for config in self.cameras:
+            camera_id = config["id"]
+            # A dead process is also only restarted after stall_timeout (backoff
+            # for a camera that can't be opened at all)
+            if now - self.last_seen[camera_id] <= self.stall_timeout:
+                continue
+            process = self.processes.get(camera_id)
+            if process is not None and process.is_alive():
+                status_queue, alert_queue, stop_event = self.channels[camera_id]
+                stop_event.set()
+                # Alerts it managed to send still count (drained before joining too:
+                # a process doesn't exit while its queue data is unread)
+                alerts.extend(self._drain(camera_id, alert_queue))
+                process.join(2.0)
+                if process.is_alive():
+                    # Stuck (e.g. in a camera read) - only its own queues can suffer
+                    process.terminate()
+                    process.join(1.0)
+                alerts.extend(self._drain(camera_id, alert_queue))
+            self.restarts[camera_id] += 1
+            self.status[camera_id] = {"camera": camera_id, "type": "error",
+                                      "message": f"restarted ({self.restarts[camera_id]})"}
+            self._start_camera(config)
+
+    def stop(self):
+        for _, _, stop_event in self.channels.values():
+            stop_event.set()
+        for process in self.processes.values():
+            process.join(2.0)
+            if process.is_alive():
+                process.terminate()
+
+
+def run_dashboard(supervisor, song=None, refresh=1.0):
+    """
+    Console dashboard: one line per camera, alerts as they come in.
+    'song' => also play this file on alerts (needs pygame).
+    """
+    player = None
+    if song:
+        import pygame
+        pygame.mixer.init()
+        player = pygame.mixer.music
+
+    supervisor.start()
+    try:
+        while True:
+            for alert in supervisor.poll():
+                print(f"!!! ALERT camera {alert['camera']} at {time.strftime('%H:%M:%S')}")
+                if player is not None and not player.get_busy():
+                    player.load(song)
+                    player.play()
+            lines = []
+            for config in supervisor.cameras:
+                s = supervisor.status.get(config["id"])
+                if s is None:
+                    lines.append(f"{config['id']}: starting...")
+                elif s["type"] == "error":
+                    lines.append(f"{config['id']}: {s['message']}")
+                else:
+                    lines.append(f"{config['id']}: {s['state']} | {s['fps']} fps | {s['window']}")
+            print(" || ".join(lines))
+            time.sleep(refresh)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monitor several cameras, one process each")
+    parser.add_argument("--camera", action="append", default=[],
+                        help="camera index or video source (repeat for each camera)")
+    parser.add_argument("--config", help="JSON list of camera configs")
+    parser.add_argument("--awake-time", type=int, default=30)
+    parser.add_argument("--song", help="play this file on alerts")
+    args = parser.parse_args()
+
+    cameras = []
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            cameras = json.load(f)
+    for i, source in enumerate(args.camera):
+        cameras.append({
+            "id": f"cam{i}",
+            "source": int(source) if source.isdigit() else source,
+            "awake_time": args.awake_time,
+        })
+    if not cameras:
+        parser.error("give at least one --camera or a --config file")
+
+    run_dashboard(MultiCameraSupervisor(cameras), song=args.song)
+
+
+if __name__ == "__main__":
+    main()
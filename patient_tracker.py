@@ -0,0 +1,177 @@
+# patient_tracker.py
+
+import math
+
+import cv2
+import numpy as np
+
+# Side of the grayscale thumbnail used as a face's appearance signature
+SIGNATURE_SIDE = 16
+
+
+def face_signature(gray, face):
+    """
+    Appearance signature of a face box: a 16x16 thumbnail, zero mean and unit
+    norm, so the dot product of two signatures is their normalized correlation
+    (insensitive to overall brightness and contrast).
+    """
+    x, y, w, h = face
+    thumb = cv2.resize(gray[y:y+h, x:x+w], (SIGNATURE_SIDE, SIGNATURE_SIDE),
+                       interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+    thumb -= thumb.mean()
+    norm = float(np.linalg.norm(thumb))
+    return thumb / norm if norm > 0 else thumb
+
+
+def _iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = min(ax + aw, bx + bw) - max(ax, bx)
+    ih = min(ay + ah, by + bh) - max(ay, by)
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+class PatientTracker:
+    """
+    Picks the patient's face among the detected faces, so a caregiver walking
+    in is never checked for open eyes.
+
+    Learned from the setup modes (frames with exactly one face): where the face
+    usually is and how big it is (as fractions of the frame), and what it looks
+    like (mean face_signature). In run mode every face is scored on
+
+        appearance similarity - position distance - size difference + overlap with
+        the patient's face in the previous frame
+
+    and only the best one goes to the eye stage, if it scores above 'min_score'.
+    A face alone in the frame still has to fit the position and size priors, but
+    at 'lone_face_slack' of their weight, so a patient who moved in bed isn't lost
+    while a caregiver leaning in (with the patient's face not detected) is not
+    taken for the patient on appearance alone. Appearance and position slowly
+    follow the selected face ('adapt_rate') to keep up with the night.
+
+    A frame whose faces are all rejected is reported by EyeDetector as
+    "face_rejected", which run mode counts neither as awake nor as asleep.
+
+    Until a setup has been learned, every face is passed through (old behaviour).
+    """
+
+    def __init__(self, min_score=0.3, position_weight=1.0, size_weight=0.5, continuity_weight=0.3,
+                 lone_face_slack=0.4, adapt_rate=0.02, max_samples=200):
+        self.min_score = min_score
+        self.position_weight = position_weight
+        self.size_weight = size_weight
+        self.continuity_weight = continuity_weight
+        self.lone_face_slack = lone_face_slack
+        self.adapt_rate = adapt_rate
+        self.max_samples = max_samples
+
+        # setup mode => [(cx, cy, size, signature), ...] in frame fractions
+        self.samples = {"setup_open": [], "setup_closed": []}
+        self.center = None         # (cx, cy) prior, fractions of the frame
+        self.size = None           # face height prior, fraction of the frame height
+        self.signature = None
+        self.last_face = None
+        self.last_score = None
+
+        self.selected = 0
+        self.rejected = 0
+
+    @property
+    def learned(self):
+        return self.signature is not None
+
+    def start_setup(self, mode):
+        self.samples[mode] = []
+
+    def observe(self, mode, gray, faces):
+        """
+        Collect a setup sample; frames with several faces are ambiguous and skipped.
+        """
+        if len(faces) != 1 or len(self.samples[mode]) >= self.max_samples:
+            return
+        height, width = gray.shape[:2]
+        x, y, w, h = faces[0]
+        self.samples[mode].append(
+            ((x + w / 2.0) / width, (y + h / 2.0) / height, h / float(height), face_signature(gray, faces[0]))
+        )
+
+    def learn(self):
+        """
+        Build the priors from every setup sample collected so far. Returns False if there are none.
+        """
+        samples = self.samples["setup_open"] + self.samples["setup_closed"]
+        if not samples:
+            return False
+        self.center = (float(np.median([s[0] for s in samples])), float(np.median([s[1] for s in samples])))
+        self.size = float(np.median([s[2] for s in samples]))
+        signature = np.mean([s[3] for s in samples], axis=0)
+        self.signature = signature / max(float(np.linalg.norm(signature)), 1e-6)
+        self.last_face = None
+        return True
+
+    def reset_tracking(self):
+        self.last_face = None
+
+    def select(self, gray, faces):
+        """
+        Faces to run the eye stage on: [patient's face], [] if none of them is the
+        patient, or all 'faces' while nothing has been learned.
+        """
+        if not self.learned or len(faces) == 0:
+            self.last_face = None
+            return faces
+
+        height, width = gray.shape[:2]
+        # A lone face is held to the priors more loosely (see the class docstring)
+        slack = self.lone_face_slack if len(faces) == 1 else 1.0
+        best, best_score, best_signature = None, -math.inf, None
+        for face in faces:
+            x, y, w, h = face
+            signature = face_signature(gray, face)
+            similarity = float(np.dot(signature, self.signature))
+            dx = (x + w / 2.0) / width - self.center[0]
+            dy = (y + h / 2.0) / height - self.center[1]
+            distance = math.hypot(dx, dy) / self.size
+            size_diff = abs(math.log((h / float(height)) / self.size))
+            score = similarity - slack * (self.position_weight * distance + self.size_weight * size_diff)
+            if self.last_face is not None:
+                score += self.continuity_weight * _iou(face, self.last_face)
+            if score > best_score:
+                best, best_score, best_signature = face, score, signature
+
+        self.last_score = best_score
+        if best_score < self.min_score:
+            self.last_face = None
+            self.rejected += 1
+            return []
+
+        self.last_face = best
+        self.selected += 1
+        rate = self.adapt_rate
+        x, y, w, h = best
+        self.center = (
+            (1.0 - rate) * self.center[0] + rate * (x + w / 2.0) / width,
+            (1.0 - rate) * self.center[1] + rate * (y + h / 2.0) / height,
+        )
+        self.size = (1.0 - rate) * self.size + rate * h / float(height)
+        signature = (1.0 - rate) * self.signature + rate * best_signature
+        self.signature = signature / max(float(np.linalg.norm(signature)), 1e-6)
+        return [best]
+
+    def get_state(self):
+        if not self.learned:
+            return None
+        return {"center": list(self.center), "size": self.size,
+                "signature": [round(float(v), 5) for v in self.signature]}
+
+    def restore_state(self, state):
+        if not state:
+            return
+        self.center = tuple(state["center"])
+        self.size = state["size"]
+        self.signature = np.asarray(state["signature"], dtype=np.float32)
+        self.last_face = None
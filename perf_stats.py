@@ -0,0 +1,130 @@
+# perf_stats.py
+
+import threading
+import time
+
+
+class StageTimer:
+    """
+    Per-stage timing for the hot path, kept in rolling windows.
+
+    Usage:
+        t0 = timer.start()
+        ...stage...
+        timer.stop("face_cascade", t0)
+
+    When disabled, start() returns 0.0 and stop() returns right away, so the
+    instrumentation costs one attribute check per stage. Each stage keeps its
+    last 'window' durations (ms) in a fixed ring; summary() turns them into
+    percentiles and a coarse histogram.
+    """
+
+    # Histogram bucket upper bounds in ms (last bucket is open-ended)
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+    def __init__(self, enabled=False, window=300):
+        self.enabled = enabled
+        self.window = window
+        self._rings = {}   # stage -> [samples list, next index, total count]
+
+    def start(self):
+        return time.perf_counter() if self.enabled else 0.0
+
+    def stop(self, stage, t0):
+        if not t0:
+            return
+        self.add(stage, (time.perf_counter() - t0) * 1000.0)
+
+    def add(self, stage, ms):
+        """
+        Record an already-measured duration (ms). Ignored when disabled.
+        """
+        if not self.enabled:
+            return
+        ring = self._rings.get(stage)
+        if ring is None:
+            ring = self._rings.setdefault(stage, [[], 0, 0])
+        samples = ring[0]
+        if len(samples) < self.window:
+            samples.append(ms)
+        else:
+            samples[ring[1]] = ms
+        ring[1] = (ring[1] + 1) % self.window
+        ring[2] += 1
+
+    def reset(self):
+        self._rings = {}
+
+    def summary(self):
+        """
+        {stage: {"count", "mean", "p50", "p90", "max", "hist"}} over each rolling window.
+        """
+        result = {}
+        for stage, (samples, _, total) in list(self._rings.items()):
+            values = sorted(samples)
+            if not values:
+                continue
+            n = len(values)
+            hist = [0] * (len(self.BUCKETS_MS) + 1)
+            for v in values:
+                for i, bound in enumerate(self.BUCKETS_MS):
+                    if v <= bound:
+                        hist[i] += 1
+                        break
+                else:
+                    hist[-1] += 1
+            result[stage] = {
+                "count": total,
+                "mean": sum(values) / n,
+                "p50": values[n // 2],
+                "p90": values[min(n - 1, int(n * 0.9))],
+                "max": values[-1],
+                "hist": hist,
+            }
+        return result
+
+    def format_summary(self):
+        lines = []
+        for stage, s in sorted(self.summary().items()):
+            lines.append(f"{stage}: {s['mean']:.1f} ms (p90 {s['p90']:.1f}, max {s['max']:.1f})")
+        return "\n".join(lines) if lines else "no samples"
+
+
+class PeriodicExporter(threading.Thread):
+    """
+    Writes the timer summary to the event log every 'interval' seconds.
+    """
+
+    def __init__(self, timer, event_log, interval=60.0):
+        super().__init__(name="perf-export", daemon=True)
+        self.timer = timer
+        self.event_log = event_log
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            if not self.timer.enabled:
+                continue
+            for stage, s in sorted(self.timer.summary().items()):
+                self.event_log.info(
+                    "perf", stage, mean_ms=round(s["mean"], 2), p50_ms=round(s["p50"], 2),
+                    p90_ms=round(s["p90"], 2), max_ms=round(s["max"], 2), count=s["count"],
+                    hist=s["hist"]
+                )
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_default_timer = None
+
+
+def get_stage_timer():
+    """
+    Process-wide StageTimer (disabled until someone turns it on).
+    """
+    global _default_timer
+    if _default_timer is None:
+        _default_timer = StageTimer()
+    return _default_timer
@@ -0,0 +1,275 @@
+# pipeline.py
+
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+
+# One captured frame, stamped with the monotonic time it left the camera
+FramePacket = namedtuple("FramePacket", "seq capture_time frame")
+
+# One detection result, ready for the GUI to display
+ResultPacket = namedtuple(
+    "ResultPacket", "seq capture_time done_time status old_mode frame faces"
+)
+
+
+class LatestQueue:
+    """
+    Bounded single-slot queue where the newest item always wins.
+
+    put() never blocks: if the consumer has not picked up the previous item yet,
+    that item is dropped (and counted) instead of queued behind the new one.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._has_item = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._has_item:
+                self.dropped += 1
+            self._item = item
+            self._has_item = True
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """
+        Take the newest item, waiting up to 'timeout' seconds (None => forever).
+        Returns None on timeout.
+        """
+        with self._cond:
+            if not self._has_item:
+                self._cond.wait(timeout)
+            if not self._has_item:
+                return None
+            item = self._item
+            self._item = None
+            self._has_item = False
+            return item
+
+    def get_nowait(self):
+        return self.get(timeout=0)
+
+
+class RateMeter:
+    """
+    Counts events and reports a rate over roughly the last 'window' seconds.
+    """
+
+    def __init__(self, window=1.0):
+        self.window = window
+        self._lock = threading.Lock()
+        self._count = 0
+        self._window_start = time.monotonic()
+        self.rate = 0.0
+
+    def tick(self):
+        with self._lock:
+            self._count += 1
+            now = time.monotonic()
+            elapsed = now - self._window_start
+            if elapsed >= self.window:
+                self.rate = self._count / elapsed
+                self._count = 0
+                self._window_start = now
+
+
+class PipelineStats:
+    """
+    Throughput of each stage plus end-to-end latency (capture -> displayed).
+    """
+
+    def __init__(self):
+        self.capture = RateMeter()
+        self.detection = RateMeter()
+        self.display = RateMeter()
+        self.latency_ms = 0.0      # last measured
+        self.latency_avg_ms = 0.0  # exponentially smoothed
+
+    def record_latency(self, capture_time, now=None):
+        if now is None:
+            now = time.monotonic()
+        latency = (now - capture_time) * 1000.0
+        self.latency_ms = latency
+        if self.latency_avg_ms == 0.0:
+            self.latency_avg_ms = latency
+        else:
+            self.latency_avg_ms += 0.1 * (latency - self.latency_avg_ms)
+
+    def summary(self):
+        return (
+            f"cap {self.capture.rate:.1f} fps | det {self.detection.rate:.1f} fps | "
+            f"view {self.display.rate:.1f} fps | latency {self.latency_avg_ms:.0f} ms"
+        )
+
+
+class CaptureThread(threading.Thread):
+    """
+    Reads frames from the camera as fast as it delivers them and publishes
+    only the latest one.
+    """
+
+    def __init__(self, cap, out_queue, stats, flip=True, governor=None):
+        super().__init__(name="capture", daemon=True)
+        self.cap = cap
+        self.out_queue = out_queue
+        self.stats = stats
+        self.flip = flip
+        self.governor = governor
+        self.running = True
+
+    def run(self):
+        seq = 0
+        if self.governor is not None:
+            self.governor.set_camera_resolution(
+                self.cap.get(cv2.CAP_PROP_FRAME_WIDTH),
+                self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+            )
+        while self.running:
+            if self.governor is not None and self.governor.pending_resolution is not None:
+                # cap must only be touched from this thread
+                width, height = self.governor.pending_resolution
+                self.governor.pending_resolution = None
+                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+
+            ret, frame = self.cap.read()
+            if not ret:
+                # Camera hiccup - don't spin at 100% CPU
+                time.sleep(0.01)
+                continue
+            capture_time = time.monotonic()
+            if self.flip:
+                # Mirror the camera feed
+                frame = cv2.flip(frame, 1)
+            seq += 1
+            self.out_queue.put(FramePacket(seq, capture_time, frame))
+            self.stats.capture.tick()
+            if self.governor is not None:
+                self.governor.record_capture()
+
+
+class DetectionWorker(threading.Thread):
+    """
+    Runs EyeDetector.process_frame on the newest captured frame.
+
+    Display results go to a LatestQueue (stale ones are dropped); status codes
+    go to an unbounded event queue so the GUI never misses a setup/run result.
+
+    With a RateGovernor, detections are paced to the governor's schedule, and
+    during its calibration the cascades are benchmarked on every frame even
+    when detection is off.
+    """
+
+    def __init__(self, detector, in_queue, out_queue, events, stats, governor=None):
+        super().__init__(name="detection", daemon=True)
+        self.detector = detector
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.events = events
+        self.stats = stats
+        self.governor = governor
+        self.detection_active = False
+        self.running = True
+
+    def run(self):
+        governor = self.governor
+        while self.running:
+            packet = self.in_queue.get(timeout=0.1)
+            if packet is None:
+                continue
+
+            if self.detection_active:
+                if governor is not None:
+                    wait = governor.wait_time()
+                    if wait > 0:
+                        # Not our slot yet => sleep, then use the newest frame
+                        time.sleep(wait)
+                        packet = self.in_queue.get_nowait() or packet
+                    governor.mark_detection_started()
+
+                t0 = time.perf_counter()
+                status, old_mode, out_frame = self.detector.process_frame(packet.frame)
+                faces = self.detector.last_faces
+                if governor is not None:
+                    governor.record_detection(time.perf_counter() - t0)
+                self.stats.detection.tick()
+            else:
+                if governor is not None and governor.calibrating:
+                    t0 = time.perf_counter()
+                    self.detector.benchmark_frame(packet.frame)
+                    governor.record_detection(time.perf_counter() - t0)
+                status, old_mode, out_frame = (None, None, packet.frame)
+                faces = None
+
+            result = ResultPacket(
+                packet.seq, packet.capture_time, time.monotonic(),
+                status, old_mode, out_frame, faces
+            )
+            if status is not None:
+                self.events.put(result)
+            self.out_queue.put(result)
+
+
+class FramePipeline:
+    """
+    capture thread -> LatestQueue -> detection worker -> LatestQueue -> GUI
+
+    The GUI polls latest_result() and events from its own event loop; it never
+    touches the camera or the cascades itself.
+    """
+
+    def __init__(self, cap, detector, flip=True, governor=None):
+        self.stats = PipelineStats()
+        self.governor = governor
+        self.frames = LatestQueue()
+        self.results = LatestQueue()
+        self.events = queue.Queue()
+        self.capture_thread = CaptureThread(
+            cap, self.frames, self.stats, flip=flip, governor=governor
+        )
+        self.detection_worker = DetectionWorker(
+            detector, self.frames, self.results, self.events, self.stats, governor=governor
+        )
+
+    def start(self):
+        self.capture_thread.start()
+        self.detection_worker.start()
+
+    def stop(self, timeout=1.0):
+        self.capture_thread.running = False
+        self.detection_worker.running = False
+        for t in (self.capture_thread, self.detection_worker):
+            if t.is_alive():
+                t.join(timeout)
+
+    def set_detection_active(self, active):
+        self.detection_worker.detection_active = active
+
+    def latest_result(self):
+        """
+        Newest result not yet shown, or None. Records end-to-end latency.
+        """
+        result = self.results.get_nowait()
+        if result is not None:
+            self.stats.record_latency(result.capture_time)
+            self.stats.display.tick()
+        return result
+
+    def pending_events(self):
+        """
+        Drain every status result produced since the last call.
+        """
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
@@ -0,0 +1,66 @@
+# preview_renderer.py
+
+import time
+
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+
+class PreviewRenderer:
+    """
+    Draws camera frames into the GUI preview without per-frame allocations.
+
+    All buffers are allocated once: the resized BGR image, an RGBA image that a
+    PIL image shares memory with, and one Tk PhotoImage that is updated with
+    paste(). Face boxes are drawn on the small preview buffer (scaled), only
+    when there are any. render() is throttled to 'max_fps' on its own,
+    whatever rate frames or detections come in at.
+    """
+
+    def __init__(self, size=(500, 400), max_fps=15.0, interpolation=cv2.INTER_LINEAR):
+        self.width, self.height = size
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.interpolation = interpolation
+        self._last_render = 0.0
+
+        self._bgr = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        self._rgba = np.zeros((self.height, self.width, 4), dtype=np.uint8)
+        # RGBA "raw" frombuffer shares self._rgba's memory - no copy per frame
+        self._pil = Image.frombuffer("RGBA", (self.width, self.height), self._rgba, "raw", "RGBA", 0, 1)
+        self.photo = None
+
+    def due(self, now=None):
+        """
+        True if enough time has passed since the last render.
+        """
+        if now is None:
+            now = time.monotonic()
+        return now - self._last_render >= self.min_interval
+
+    def render(self, frame, faces=None, color=(0, 255, 0)):
+        """
+        Resize 'frame' (BGR) into the preview buffers and update the PhotoImage.
+        'faces' are (x, y, w, h) boxes in frame coordinates.
+        Returns the PhotoImage (the same object every time).
+        """
+        self._last_render = time.monotonic()
+        cv2.resize(frame, (self.width, self.height), dst=self._bgr, interpolation=self.interpolation)
+
+        if faces is not None and len(faces) > 0:
+            sx = self.width / float(frame.shape[1])
+            sy = self.height / float(frame.shape[0])
+            for (x, y, w, h) in faces:
+                cv2.rectangle(
+                    self._bgr,
+                    (int(x * sx), int(y * sy)),
+                    (int((x + w) * sx), int((y + h) * sy)),
+                    color, 2
+                )
+
+        cv2.cvtColor(self._bgr, cv2.COLOR_BGR2RGBA, dst=self._rgba)
+        if self.photo is None:
+            self.photo = ImageTk.PhotoImage(self._pil)
+        else:
+            self.photo.paste(self._pil)
+        return self.photo
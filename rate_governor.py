@@ -0,0 +1,174 @@
+# rate_governor.py
+
+import threading
+import time
+
+from event_log import get_event_log
+
+# Camera resolutions to fall back to when detection can't keep up (largest first)
+RESOLUTIONS = [(1280, 720), (960, 540), (640, 480), (480, 360), (320, 240)]
+
+
+class RateGovernor:
+    """
+    Holds detection at a steady rate that the machine can actually sustain.
+
+    1) Calibration: for 'calibration_time' seconds the detection worker runs the
+       cascades as fast as it can and reports every capture and every detection
+       duration. Capture fps and detection capacity are measured from that.
+    2) Configuration: the detection rate becomes min(target_rate, what the
+       machine can do with 'headroom' to spare). If even that is below
+       'min_rate', a lower camera resolution is requested and calibration repeats.
+    3) Steady state: detections are scheduled on absolute timestamps
+       (next_deadline += period), so processing time doesn't add to the period.
+       If the smoothed detection time stops fitting the budget the rate is
+       lowered, and raised again (up to target_rate) once there is room.
+    """
+
+    def __init__(self, target_rate=10.0, min_rate=4.0, calibration_time=20.0,
+                 headroom=0.8, adapt_interval=5.0, clock=time.monotonic, event_log=None):
+        self.log = event_log if event_log is not None else get_event_log()
+        self.target_rate = target_rate
+        self.min_rate = min_rate
+        self.calibration_time = calibration_time
+        self.headroom = headroom
+        self.adapt_interval = adapt_interval
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        self.calibrating = True
+        self.rate = target_rate
+        self.period = 1.0 / target_rate
+        self.next_deadline = 0.0
+
+        # Measurements
+        self.capture_fps = 0.0
+        self.detect_capacity = 0.0   # detections/s if the worker never waits
+        self.detect_time_avg = 0.0   # smoothed seconds per detection
+
+        # Resolution handling - the capture thread applies pending_resolution
+        self.resolution_index = None
+        self.pending_resolution = None
+
+        self._reset_calibration()
+        self._last_adapt = self.clock()
+
+    def _reset_calibration(self):
+        self.calibrating = True
+        self._cal_start = self.clock()
+        self._cal_captures = 0
+        self._cal_detections = 0
+        self._cal_detect_time = 0.0
+
+    # ----------------- Measurements -----------------
+    def record_capture(self):
+        if self.calibrating:
+            with self.lock:
+                self._cal_captures += 1
+
+    def record_detection(self, duration):
+        with self.lock:
+            if self.detect_time_avg == 0.0:
+                self.detect_time_avg = duration
+            else:
+                self.detect_time_avg += 0.1 * (duration - self.detect_time_avg)
+
+            if self.calibrating:
+                self._cal_detections += 1
+                self._cal_detect_time += duration
+                if self.clock() - self._cal_start >= self.calibration_time:
+                    self._finish_calibration()
+            else:
+                self._adapt()
+
+    # ----------------- Scheduling -----------------
+    def wait_time(self):
+        """
+        Seconds the detection worker should wait before the next detection.
+        Always 0 while calibrating (we want to measure full capacity).
+        """
+        if self.calibrating:
+            return 0.0
+        return max(0.0, self.next_deadline - self.clock())
+
+    def mark_detection_started(self):
+        """
+        Advance the schedule by one period. If we fell more than a period
+        behind, restart from now instead of bursting to catch up.
+        """
+        if self.calibrating:
+            return
+        now = self.clock()
+        with self.lock:
+            self.next_deadline += self.period
+            if self.next_deadline < now:
+                self.next_deadline = now + self.period
+
+    # ----------------- Configuration -----------------
+    def _finish_calibration(self):
+        elapsed = max(self.clock() - self._cal_start, 1e-6)
+        self.capture_fps = self._cal_captures / elapsed
+        self.detect_capacity = self._cal_detections / max(self._cal_detect_time, 1e-6)
+
+        achievable = self.detect_capacity * self.headroom
+        if self.capture_fps > 0:
+            achievable = min(achievable, self.capture_fps)
+
+        if achievable < self.min_rate and self._step_down_resolution():
+            self.log.warning("RateGovernor", "detection too slow, trying a lower resolution",
+                             achievable=round(achievable, 1),
+                             resolution=f"{self.pending_resolution[0]}x{self.pending_resolution[1]}")
+            self._reset_calibration()
+            return
+
+        self._set_rate(max(self.min_rate, min(self.target_rate, achievable)))
+        self.calibrating = False
+        self.next_deadline = self.clock()
+        self.log.info("RateGovernor", "calibrated", capture_fps=round(self.capture_fps, 1),
+                      detect_capacity=round(self.detect_capacity, 1), rate=round(self.rate, 1))
+
+    def _step_down_resolution(self):
+        if self.resolution_index is None:
+            # Camera resolution unknown to us - start from the common 640x480
+            self.resolution_index = RESOLUTIONS.index((640, 480))
+        elif self.resolution_index + 1 < len(RESOLUTIONS):
+            self.resolution_index += 1
+        else:
+            return False
+        self.pending_resolution = RESOLUTIONS[self.resolution_index]
+        return True
+
+    def set_camera_resolution(self, width, height):
+        """
+        Tell the governor what resolution the camera is actually running at.
+        """
+        for i, (w, h) in enumerate(RESOLUTIONS):
+            if (w, h) == (int(width), int(height)):
+                self.resolution_index = i
+                return
+
+    def _set_rate(self, rate):
+        self.rate = rate
+        self.period = 1.0 / rate
+
+    def _adapt(self):
+        now = self.clock()
+        if now - self._last_adapt < self.adapt_interval:
+            return
+        self._last_adapt = now
+
+        budget = self.period * self.headroom
+        if self.detect_time_avg > budget and self.rate > self.min_rate:
+            # Machine slowed down => back off
+            self._set_rate(max(self.min_rate, self.rate * 0.8))
+            self.log.warning("RateGovernor", "detection too slow, lowering the rate",
+                             detect_ms=round(self.detect_time_avg * 1000.0), rate=round(self.rate, 1))
+        elif self.detect_time_avg < budget * 0.5 and self.rate < self.target_rate:
+            self._set_rate(min(self.target_rate, self.rate * 1.1))
+            self.log.info("RateGovernor", "room to spare, raising the rate", rate=round(self.rate, 1))
+
+    def summary(self):
+        if self.calibrating:
+            left = max(0.0, self.calibration_time - (self.clock() - self._cal_start))
+            return f"calibrating ({left:.0f}s left)"
+        return f"{self.rate:.1f}/s (capacity {self.detect_capacity:.1f}/s)"
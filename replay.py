@@ -0,0 +1,305 @@
+# replay.py
+"""
+Offline replay / benchmark for EyeDetector.
+
+Feeds a recorded video file or a directory of images through
+EyeDetector.process_frame on a simulated clock (so 15s blocks depend on the
+footage, not on how fast this machine is), and reports:
+  - throughput (frames/s), per-frame latency percentiles and per-stage timings
+  - hit rates per label, if a labels file is given
+  - run-mode alerts (status 2) by frame index
+
+Labels file: one "frame_index,label" per line, label in open / closed / no_face.
+Lines starting with '#' and unknown labels are ignored.
+
+Example:
+    python replay.py night1.mp4 --labels night1_labels.csv --out night1_results.json
+"""
+
+import argparse
+import json
+import os
+import time
+
+import cv2
+
+from cv_close_eye_detect import EyeDetector
+from event_log import get_event_log
+from perf_stats import StageTimer
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+LABELS = ("open", "closed", "no_face")
+
+
+class SimulatedClock:
+    """
+    Callable clock for EyeDetector(clock=...), advanced by hand per frame.
+    """
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def iter_frames(source):
+    """
+    Yields frames (BGR) from a video file or an image directory.
+    """
+    if os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if n.lower().endswith(IMAGE_EXTENSIONS))
+        for name in names:
+            frame = cv2.imread(os.path.join(source, name))
+            if frame is not None:
+                yield frame
+        return
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video: {source}")
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+
+def source_fps(source, default=10.0):
+    """
+    Frame rate recorded in the video file; 'default' for image directories
+    or files that don't carry one.
+    """
+    if os.path.isdir(source):
+        return default
+    cap = cv2.VideoCapture(source)
+    fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0
+    cap.release()
+    return fps if fps and fps > 0 else default
+
+
+def load_labels(path):
+    labels = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = [p.strip() for p in line.split(",")]
+            if len(parts) < 2 or not parts[0].isdigit() or parts[1] not in LABELS:
+                continue
+            labels[int(parts[0])] = parts[1]
+    return labels
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def replay(source, fps=None, labels=None, mode="run", awake_time=30, flip=False,
+           detector_kwargs=None):
+    """
+    Runs the whole source through a fresh EyeDetector and returns a results dict.
+    'fps' is the simulated capture rate (None => from the video file).
+    """
+    if fps is None:
+        fps = source_fps(source)
+    labels = labels or {}
+
+    clock = SimulatedClock()
+    timer = StageTimer(enabled=True, window=10000)
+    detector = EyeDetector(clock=clock, stage_timer=timer, **(detector_kwargs or {}))
+    detector.start_detection(mode, awake_time=awake_time)
+
+    latencies = []
+    states = {"open": 0, "closed": 0, "no_face": 0, "face_rejected": 0}
+    label_totals = {name: 0 for name in LABELS}
+    label_hits = {name: 0 for name in LABELS}
+    face_labelled = 0
+    face_found = 0
+    alerts = []
+    setup_result = None
+
+    wall_start = time.perf_counter()
+    index = -1
+    for index, frame in enumerate(iter_frames(source)):
+        if flip:
+            frame = cv2.flip(frame, 1)
+
+        processed = detector.active
+        t0 = time.perf_counter()
+        status, old_mode, _ = detector.process_frame(frame)
+        elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        clock.advance(1.0 / fps)
+        if not processed:
+            # Nothing was detected on this frame - last_state would be stale
+            continue
+        latencies.append(elapsed_ms)
+
+        state = detector.last_state
+        if state in states:
+            states[state] += 1
+
+        expected = labels.get(index)
+        if expected is not None:
+            label_totals[expected] += 1
+            if state == expected:
+                label_hits[expected] += 1
+            if expected != "no_face":
+                face_labelled += 1
+                if state != "no_face":
+                    face_found += 1
+
+        if status == 2:
+            alerts.append({"frame": index, "time": round(index / fps, 3)})
+        elif status in (0, 1):
+            if setup_result is None:
+                setup_result = {"frame": index, "success": bool(status), "mode": old_mode}
+            # Setup modes stop themselves - keep measuring the cascades anyway
+            detector.start_detection(mode, awake_time=awake_time)
+
+    wall_time = time.perf_counter() - wall_start
+    frames = index + 1
+    latencies.sort()
+
+    return {
+        "source": source,
+        "mode": mode,
+        "frames": frames,
+        "processed_frames": len(latencies),
+        "simulated_fps": fps,
+        "wall_time_s": round(wall_time, 3),
+        "throughput_fps": round(len(latencies) / wall_time, 2) if wall_time > 0 else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 3),
+            "p90": round(percentile(latencies, 90), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(latencies[-1], 3) if latencies else 0.0,
+        },
+        "stages_ms": {
+            stage: {k: round(v, 3) for k, v in summary.items() if k in ("mean", "p50", "p90", "max")}
+            for stage, summary in timer.summary().items()
+        },
+        "states": states,
+        "hit_rate": {
+            name: round(label_hits[name] / label_totals[name], 4)
+            for name in LABELS if label_totals[name]
+        },
+        "face_hit_rate": round(face_found / face_labelled, 4) if face_labelled else None,
+        "labelled_frames": sum(label_totals.values()),
+        "alerts": alerts,
+        "setup_result": setup_result,
+        "backends": {
+            "face": detector.face_backend.stats(),
+            "eye": detector.eye_backend.stats(),
+            "eye_classifier": (detector.classifier_backend.stats()
+                               if detector.classifier_backend is not None else None),
+        },
+        "motion_skip_rate": detector.motion_gate.skip_rate() if detector.motion_gate is not None else None,
+        "detector": detector_kwargs or {},
+    }
+
+
+def compare_face_backends(source, labels, backends, target_hit_rate=0.9, detector_kwargs=None,
+                          **replay_kwargs):
+    """
+    Replays the same footage with each face backend and returns
+    (results per backend, fastest backend whose face hit rate meets the target).
+    """
+    results = {}
+    for name in backends:
+        kwargs = dict(detector_kwargs or {}, face_backend=name)
+        results[name] = replay(source, labels=labels, detector_kwargs=kwargs, **replay_kwargs)
+
+    qualified = [
+        name for name, r in results.items()
+        if r["face_hit_rate"] is not None and r["face_hit_rate"] >= target_hit_rate
+    ]
+    best = min(qualified, key=lambda name: results[name]["backends"]["face"]["avg_ms"], default=None)
+    return results, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded footage through EyeDetector")
+    parser.add_argument("source", help="video file or directory of images")
+    parser.add_argument("--labels", help="per-frame labels file (frame_index,open|closed|no_face)")
+    parser.add_argument("--out", help="write results as JSON to this file")
+    parser.add_argument("--fps", type=float, help="simulated capture rate (default: from video, else 10)")
+    parser.add_argument("--mode", default="run", choices=("run", "setup_open", "setup_closed"))
+    parser.add_argument("--awake-time", type=int, default=30)
+    parser.add_argument("--flip", action="store_true", help="mirror frames like the live camera")
+    parser.add_argument("--no-tracking", action="store_true", help="full-frame face search on every frame")
+    parser.add_argument("--no-motion-gate", action="store_true", help="run the cascades on static frames too")
+    parser.add_argument("--detection-scale", type=float, default=0.5)
+    parser.add_argument("--alert-policy", default="block", choices=("block", "sliding"))
+    parser.add_argument("--face-backend", default="haar", help="haar, lbp or dnn")
+    parser.add_argument("--eye-backend", default="eye_tree", help="eye_tree or eye")
+    parser.add_argument("--patient", metavar="NAME",
+                        help="use this patient's cached eye classifier in run mode (see eye_classifier.py)")
+    parser.add_argument("--compare", nargs="+", metavar="BACKEND",
+                        help="replay once per face backend and pick the fastest that meets --target")
+    parser.add_argument("--target", type=float, default=0.9, help="face hit rate target for --compare")
+    args = parser.parse_args()
+
+    labels = load_labels(args.labels) if args.labels else None
+    detector_kwargs = {
+        "tracking": not args.no_tracking,
+        "motion_gate": not args.no_motion_gate,
+        "detection_scale": args.detection_scale,
+        "alert_policy": args.alert_policy,
+        "eye_backend": args.eye_backend,
+        "patient_id": args.patient,
+    }
+
+    if args.compare:
+        all_results, best = compare_face_backends(
+            args.source, labels, args.compare, target_hit_rate=args.target, fps=args.fps,
+            mode=args.mode, awake_time=args.awake_time, flip=args.flip,
+            detector_kwargs=detector_kwargs
+        )
+        for name, r in all_results.items():
+            face = r["backends"]["face"]
+            print(f"[replay] {name}: {face['avg_ms']} ms/call, {r['throughput_fps']} fps, "
+                  f"face hit rate {r['face_hit_rate']}, eye hit rate {r['hit_rate']}")
+        print(f"[replay] fastest backend meeting {args.target}: {best}")
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump({"results": all_results, "best": best, "target": args.target}, f, indent=2)
+        get_event_log().close()
+        return
+
+    detector_kwargs["face_backend"] = args.face_backend
+    results = replay(
+        args.source, fps=args.fps, labels=labels, mode=args.mode,
+        awake_time=args.awake_time, flip=args.flip, detector_kwargs=detector_kwargs
+    )
+
+    print(f"[replay] {results['processed_frames']}/{results['frames']} frames processed, {results['throughput_fps']} fps, "
+          f"p50={results['latency_ms']['p50']} ms, p99={results['latency_ms']['p99']} ms")
+    if results["hit_rate"]:
+        print(f"[replay] hit rate: {results['hit_rate']}, face hit rate: {results['face_hit_rate']}")
+    if results["motion_skip_rate"] is not None:
+        print(f"[replay] static frames skipped: {results['motion_skip_rate']:.0%}")
+    print(f"[replay] alerts: {len(results['alerts'])}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"[replay] results written to {args.out}")
+    get_event_log().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# sequential_test.py
+
+import math
+
+
+class SequentialRatioTest:
+    """
+    Wald's sequential probability ratio test on the setup hits.
+
+    H1 "setup works": frames are hits with probability p_success (0.9)
+    H0 "setup fails": frames are hits with probability p_fail (0.7)
+    (either side of the 0.8 the setup modes have always required).
+
+    Every frame adds its log-likelihood ratio; the test stops as soon as it
+    crosses log((1 - beta) / alpha) (success) or log(beta / (1 - alpha)) (fail),
+    so with alpha = beta = 0.05 each wrong call has at most a 5% chance.
+
+    Consecutive camera frames are far from independent, so a frame only counts
+    for the time since the previous one, at 'max_rate' observations per second:
+    at 10 fps and max_rate 3, each frame is 0.3 of an observation.
+    """
+
+    def __init__(self, p_success=0.9, p_fail=0.7, alpha=0.05, beta=0.05, max_rate=3.0):
+        self.hit_llr = math.log(p_success / p_fail)
+        self.miss_llr = math.log((1.0 - p_success) / (1.0 - p_fail))
+        self.upper = math.log((1.0 - beta) / alpha)
+        self.lower = math.log(beta / (1.0 - alpha))
+        self.max_rate = max_rate
+        self.reset(0.0)
+
+    def reset(self, now):
+        self.llr = 0.0
+        self.observations = 0.0
+        self.last_time = now
+
+    def update(self, hit, now):
+        """
+        Add one frame. Returns True (success settled), False (failure settled) or None.
+        """
+        weight = min(1.0, max(0.0, now - self.last_time) * self.max_rate)
+        self.last_time = now
+        self.observations += weight
+        self.llr += weight * (self.hit_llr if hit else self.miss_llr)
+        return self.decision()
+
+    def decision(self):
+        if self.llr >= self.upper:
+            return True
+        if self.llr <= self.lower:
+            return False
+        return None
+
+    def confidence(self):
+        """
+        Probability (equal priors) that the setup works, from the evidence so far.
+        """
+        return 1.0 / (1.0 + math.exp(-self.llr))
@@ -0,0 +1,113 @@
+# session_recorder.py
+"""
+Per-frame night session recorder.
+
+Every processed frame becomes one fixed-width record in a memory-mapped file:
+    time, face box (x, y, w, h), eye count, state (see STATE_CODES),
+    and the durations (ms) of the gray conversion, face stage, eye stage and whole frame.
+
+The file is a 64-byte header followed by a packed array of RECORD_DTYPE. It
+grows in chunks, so memory use stays bounded over a whole night (only the OS
+page cache holds it) and no per-frame Python objects are kept. load_session()
+maps a file back as a read-only numpy array without parsing anything.
+"""
+
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"EYESREC1"
+HEADER_SIZE = 64
+# magic, record size, valid record count
+HEADER_FORMAT = "<8sIQ"
+
+RECORD_DTYPE = np.dtype([
+    ("time", "<f8"),
+    ("x", "<i2"),
+    ("y", "<i2"),
+    ("w", "<i2"),
+    ("h", "<i2"),
+    ("eyes", "u1"),
+    ("state", "u1"),
+    ("gray_ms", "<f4"),
+    ("face_ms", "<f4"),
+    ("eyes_ms", "<f4"),
+    ("total_ms", "<f4"),
+])
+
+
+class SessionRecorder:
+    def __init__(self, path, chunk_records=36000, flush_every=600):
+        """
+        chunk_records => how many records the file grows by (36000 = 1 hour at 10/s)
+        flush_every => write the header count and sync the map every N records
+        """
+        self.path = path
+        self.chunk_records = chunk_records
+        self.flush_every = flush_every
+        self.count = 0
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(self._header(0))
+        self.capacity = 0
+        self._mm = None
+        self._grow()
+
+    @staticmethod
+    def _header(count):
+        header = struct.pack(HEADER_FORMAT, MAGIC, RECORD_DTYPE.itemsize, count)
+        return header.ljust(HEADER_SIZE, b"\0")
+
+    def _grow(self):
+        if self._mm is not None:
+            self._mm.flush()
+            del self._mm
+        self.capacity += self.chunk_records
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER_SIZE + self.capacity * RECORD_DTYPE.itemsize)
+        self._mm = np.memmap(self.path, dtype=RECORD_DTYPE, mode="r+",
+                             offset=HEADER_SIZE, shape=(self.capacity,))
+
+    def append(self, t, box, eyes, state, gray_ms, face_ms, eyes_ms, total_ms):
+        if self.count >= self.capacity:
+            self._grow()
+        x, y, w, h = box if box is not None else (0, 0, 0, 0)
+        self._mm[self.count] = (t, x, y, w, h, eyes, state, gray_ms, face_ms, eyes_ms, total_ms)
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self.flush()
+
+    def flush(self):
+        self._mm.flush()
+        with open(self.path, "r+b") as f:
+            f.write(self._header(self.count))
+
+    def close(self):
+        if self._mm is None:
+            return
+        self.flush()
+        del self._mm
+        self._mm = None
+        # Drop the unused tail of the last chunk
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER_SIZE + self.count * RECORD_DTYPE.itemsize)
+
+
+def load_session(path):
+    """
+    Records of a session file as a read-only structured array (memory-mapped).
+    Works on files still being written: only the records counted in the header.
+    """
+    with open(path, "rb") as f:
+        magic, record_size, count = struct.unpack(
+            HEADER_FORMAT, f.read(struct.calcsize(HEADER_FORMAT))
+        )
+    if magic != MAGIC or record_size != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path} is not a session file (or was written by another version)")
+    if count == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
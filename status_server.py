@@ -0,0 +1,330 @@
+# status_server.py
+"""
+Optional HTTP server so a caregiver can follow the monitor from another room.
+
+    /             small page with the live preview and the event list
+    /status       JSON snapshot (mode, eye state, alert window)
+    /events       Server-Sent Events push: "state", "block", "alert", "setup" and a
+                  "status" snapshot every second
+    /stream.mjpg  MJPEG preview with the face boxes drawn
+
+Only the Python standard library and OpenCV are used (SSE instead of WebSockets:
+browsers reconnect on their own and no extra package is needed).
+
+The stream shows the patient's camera, so by default the server only listens on
+127.0.0.1. Listening on other interfaces (e.g. host="0.0.0.0") needs a 'token';
+every request must then carry it, as the password of HTTP basic auth (the
+browser asks for it once, any user name) or as ?token=... in the URL.
+
+Nothing here runs on the detection thread except publish(), which only appends
+to the clients' bounded queues. Frames are handed over latest-wins and encoded
+once, on the encoder thread, at most 'max_fps' times a second and only while
+someone is watching; every viewer gets the same JPEG bytes. A slow viewer just
+gets the newest JPEG when it's ready again (frames are dropped, never queued),
+and a viewer whose event queue is full loses its oldest events.
+"""
+
+import base64
+import hmac
+import ipaddress
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from event_log import get_event_log
+from pipeline import LatestQueue
+
+INDEX_PAGE = b"""<!doctype html>
+<html><head><meta charset="utf-8"><title>Eye monitor</title></head>
+<body style="font-family: sans-serif">
+<img id="stream" style="max-width: 100%">
+<h3 id="status">connecting...</h3>
+<ul id="events"></ul>
+<script>
+// Pass ?token=... on to the stream and the events
+document.getElementById("stream").src = "/stream.mjpg" + location.search;
+var source = new EventSource("/events" + location.search);
+source.addEventListener("status", function (e) {
+  var s = JSON.parse(e.data);
+  document.getElementById("status").textContent = (s.mode || "idle") + " | " + (s.state || "-") + " | " + s.window;
+});
+["state", "block", "alert", "setup"].forEach(function (kind) {
+  source.addEventListener(kind, function (e) {
+    var li = document.createElement("li");
+    li.textContent = new Date().toLocaleTimeString() + " " + kind + " " + e.data;
+    if (kind === "alert") li.style.color = "red";
+    var list = document.getElementById("events");
+    list.insertBefore(li, list.firstChild);
+    while (list.childNodes.length > 50) list.removeChild(list.lastChild);
+  });
+});
+</script>
+</body></html>
+"""
+
+
+def _is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Set on the subclass built by StatusServer.start()
+    status_server = None
+
+    def do_GET(self):
+        path, _, query = self.path.partition("?")
+        if not self.status_server.authorized(self.headers.get("Authorization"), query):
+            self.send_response(401)
+            self.send_header("WWW-Authenticate", 'Basic realm="Eye monitor"')
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if path == "/":
+            self._send_bytes(INDEX_PAGE, "text/html; charset=utf-8")
+        elif path == "/status":
+            self._send_bytes(json.dumps(self.status_server.snapshot()).encode("utf-8"), "application/json")
+        elif path == "/events":
+            self.status_server.serve_events(self)
+        elif path == "/stream.mjpg":
+            self.status_server.serve_mjpeg(self)
+        else:
+            self.send_error(404)
+
+    def _send_bytes(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        get_event_log().debug("StatusServer", format % args, client=self.client_address[0])
+
+
+class StatusServer:
+    def __init__(self, host="127.0.0.1", port=8080, status_fn=None, stream_size=(480, 360),
+                 jpeg_quality=70, max_fps=10.0, event_queue_size=100, token=None, event_log=None):
+        """
+        host => interface to listen on; anything but a loopback address needs 'token'
+        token => password every request must carry (None => no check, loopback only)
+        status_fn => returns a JSON-able dict for /status and the 1 s "status" events
+        stream_size => MJPEG frame size (frames are resized before encoding)
+        """
+        if not token and not _is_loopback(host):
+            raise ValueError(f"Serving the camera on {host} needs a token")
+        self.host = host
+        self.port = port
+        self.token = token
+        self.status_fn = status_fn
+        self.stream_size = stream_size
+        self.jpeg_quality = jpeg_quality
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.event_queue_size = event_queue_size
+        self.log = event_log if event_log is not None else get_event_log()
+
+        self._frames = LatestQueue()
+        self._small = np.zeros((stream_size[1], stream_size[0], 3), dtype=np.uint8)
+        self._jpeg = None
+        self._jpeg_seq = 0
+        self._jpeg_cond = threading.Condition()
+        self.stream_clients = 0
+        self.encoded_frames = 0
+
+        self._event_queues = set()
+        self._event_lock = threading.Lock()
+        self._event_id = 0
+
+        self._running = False
+        self._httpd = None
+        self._threads = []
+
+    # ----------------- Producers (any thread) -----------------
+    def publish(self, kind, info=None):
+        """
+        Push an event to every /events client. Never blocks.
+        Usable directly as EyeDetector.event_listener.
+        """
+        with self._event_lock:
+            self._event_id += 1
+            message = (self._event_id, kind, json.dumps(info or {}))
+            for q in self._event_queues:
+                if q.full():
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+                try:
+                    q.put_nowait(message)
+                except queue.Full:
+                    pass
+
+    def publish_frame(self, frame, faces=None):
+        """
+        Offer the newest frame (BGR) for the MJPEG stream. Never blocks or copies;
+        the frame must not be modified afterwards.
+        """
+        if self.stream_clients:
+            self._frames.put((frame, faces))
+
+    def authorized(self, authorization, query):
+        if not self.token:
+            return True
+        expected = self.token.encode("utf-8")
+        for part in query.split("&"):
+            name, _, value = part.partition("=")
+            if name == "token" and hmac.compare_digest(value.encode("utf-8"), expected):
+                return True
+        if authorization and authorization.startswith("Basic "):
+            try:
+                credentials = base64.b64decode(authorization[6:].strip())
+            except ValueError:
+                return False
+            password = credentials.partition(b":")[2]
+            return hmac.compare_digest(password, expected)
+        return False
+
+    def snapshot(self):
+        status = self.status_fn() if self.status_fn is not None else {}
+        return dict(status, viewers=self.stream_clients, time=time.time())
+
+    # ----------------- Lifecycle -----------------
+    def start(self):
+        handler = type("StatusHandler", (_Handler,), {"status_server": self})
+        self._httpd = ThreadingHTTPServer((self.host, self.port), handler)
+        self._httpd.daemon_threads = True
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._httpd.serve_forever, name="StatusServer", daemon=True),
+            threading.Thread(target=self._encode_loop, name="StatusServerEncoder", daemon=True),
+            threading.Thread(target=self._status_loop, name="StatusServerStatus", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+        self.log.info("StatusServer", f"Serving on http://{self.host}:{self.port}/")
+
+    def stop(self):
+        self._running = False
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+        with self._jpeg_cond:
+            self._jpeg_cond.notify_all()
+
+    # ----------------- Worker threads -----------------
+    def _encode_loop(self):
+        width, height = self.stream_size
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality]
+        last = 0.0
+        while self._running:
+            item = self._frames.get(timeout=0.5)
+            if item is None:
+                continue
+            wait = self.min_interval - (time.monotonic() - last)
+            if wait > 0:
+                time.sleep(wait)
+                item = self._frames.get_nowait() or item
+            last = time.monotonic()
+
+            frame, faces = item
+            cv2.resize(frame, (width, height), dst=self._small, interpolation=cv2.INTER_AREA)
+            if faces:
+                sx = width / float(frame.shape[1])
+                sy = height / float(frame.shape[0])
+                for (x, y, w, h) in faces:
+                    cv2.rectangle(self._small, (int(x * sx), int(y * sy)),
+                                  (int((x + w) * sx), int((y + h) * sy)), (0, 255, 0), 2)
+            ok, jpeg = cv2.imencode(".jpg", self._small, params)
+            if not ok:
+                continue
+            with self._jpeg_cond:
+                self._jpeg = jpeg.tobytes()
+                self._jpeg_seq += 1
+                self.encoded_frames += 1
+                self._jpeg_cond.notify_all()
+
+    def _status_loop(self):
+        while self._running:
+            time.sleep(1.0)
+            try:
+                self.publish("status", self.snapshot())
+            except Exception as e:
+                self.log.error("StatusServer", "status snapshot failed", error=e)
+
+    # ----------------- Per-client handlers (one thread each) -----------------
+    def serve_events(self, handler):
+        q = queue.Queue(maxsize=self.event_queue_size)
+        with self._event_lock:
+            self._event_queues.add(q)
+        try:
+            handler.send_response(200)
+            handler.send_header("Content-Type", "text/event-stream")
+            handler.send_header("Cache-Control", "no-cache")
+            handler.end_headers()
+            handler.wfile.write(f"event: status\ndata: {json.dumps(self.snapshot())}\n\n".encode("utf-8"))
+            handler.wfile.flush()
+            while self._running:
+                try:
+                    event_id, kind, data = q.get(timeout=15.0)
+                    chunk = f"id: {event_id}\nevent: {kind}\ndata: {data}\n\n"
+                except queue.Empty:
+                    chunk = ": keepalive\n\n"
+                handler.wfile.write(chunk.encode("utf-8"))
+                handler.wfile.flush()
+        except OSError:
+            # Client went away
+            pass
+        finally:
+            with self._event_lock:
+                self._event_queues.discard(q)
+
+    def serve_mjpeg(self, handler):
+        with self._jpeg_cond:
+            self.stream_clients += 1
+        try:
+            handler.send_response(200)
+            handler.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+            handler.send_header("Cache-Control", "no-cache")
+            handler.end_headers()
+            seen = 0
+            while self._running:
+                with self._jpeg_cond:
+                    self._jpeg_cond.wait_for(lambda: self._jpeg_seq != seen or not self._running, timeout=5.0)
+                    if self._jpeg_seq == seen:
+                        continue
+                    seen, jpeg = self._jpeg_seq, self._jpeg
+                # Written outside the lock: a slow client only delays itself
+                handler.wfile.write(
+                    b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                    + str(len(jpeg)).encode("ascii") + b"\r\n\r\n" + jpeg + b"\r\n"
+                )
+                handler.wfile.flush()
+        except OSError:
+            # Client went away
+            pass
+        finally:
+            with self._jpeg_cond:
+                self.stream_clients -= 1
+
+
+def detector_status(detector):
+    """
+    status_fn for an EyeDetector.
+    """
+    def status():
+        return {
+            "mode": detector.mode,
+            "state": detector.last_state,
+            "window": detector.alert_policy.window_summary(),
+        }
+    return status
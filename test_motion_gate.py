@@ -0,0 +1,61 @@
+# test_motion_gate.py
+"""
+Regression test: setups with the motion gate on (the default) must not touch
+the gate, which is only consulted in run mode.
+
+    python -m pytest test_motion_gate.py
+"""
+
+import numpy as np
+
+from cv_close_eye_detect import EyeDetector
+from event_log import EventLog
+from replay import SimulatedClock
+
+
+class _FixedFaceBackend:
+    """Always finds the same face; no cascade files needed."""
+
+    name = "fixed"
+
+    def detect_faces(self, gray, min_side):
+        return [(200, 120, 200, 200)]
+
+
+class _OpenEyeBackend:
+    name = "open"
+
+    def eyes_open(self, gray, face):
+        return (True, 2)
+
+
+def _detector(tmp_path):
+    return EyeDetector(clock=SimulatedClock(), face_backend=_FixedFaceBackend(),
+                       eye_backend=_OpenEyeBackend(), tracking=False,
+                       event_log=EventLog(path=str(tmp_path / "events.log")))
+
+
+def test_setup_with_default_motion_gate(tmp_path):
+    detector = _detector(tmp_path)
+    assert detector.motion_gate is not None
+    frame = np.full((480, 640, 3), 128, dtype=np.uint8)
+
+    detector.start_detection("setup_open", awake_time=0)
+    status = None
+    for _ in range(200):
+        status, old_mode, _ = detector.process_frame(frame)
+        detector.clock.advance(0.1)
+        if status is not None:
+            break
+    assert (status, old_mode) == (1, "setup_open")
+    # Every setup frame was detected, none skipped by the gate
+    assert detector.motion_gate.skips == 0
+    assert detector.motion_gate.detections == 0
+
+    # Run mode afterwards still uses the gate on a static scene
+    detector.start_detection("run", awake_time=30)
+    for _ in range(5):
+        detector.process_frame(frame)
+        detector.clock.advance(0.1)
+    assert detector.motion_gate.skips > 0
+    detector.log.close()